@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Module-level so they can be pickled into a ProcessPoolExecutor
+def _hash(secret: str) -> str:
+    return pwd_context.hash(secret)
+
+def _verify(secret: str, hashed: str) -> bool:
+    return pwd_context.verify(secret, hashed)
+
+class HashingPool:
+    """Runs bcrypt hash/verify off the event loop with a bounded number of concurrent jobs."""
+
+    def __init__(self, workers: int, kind: str = "thread"):
+        self.workers = max(1, workers)
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Metrics
+        self.queued = 0
+        self.in_flight = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def _ensure(self):
+        if self._executor is None:
+            pool_cls = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+            self._executor = pool_cls(max_workers=self.workers)
+            logger.info(f"Hashing pool started: {self.kind} x{self.workers}")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+    async def _run(self, fn, *args):
+        self._ensure()
+        enqueued = time.perf_counter()
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        started = time.perf_counter()
+        self.total_wait += started - enqueued
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            elapsed = time.perf_counter() - started
+            self.total_run += elapsed
+            metrics.hash_seconds.observe(elapsed, (fn.__name__.lstrip("_"),))
+            self._slots.release()
+
+    async def hash(self, secret: str) -> str:
+        return await self._run(_hash, secret)
+
+    async def verify(self, secret: str, hashed: str) -> bool:
+        return await self._run(_verify, secret, hashed)
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "peak_queued": self.peak_queued,
+            "completed": self.completed,
+            "avg_wait_ms": round(self.total_wait / done * 1000, 2),
+            "avg_run_ms": round(self.total_run / done * 1000, 2),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+hash_pool = HashingPool(settings.HASH_POOL_WORKERS, settings.HASH_POOL_KIND)
@@ -0,0 +1,106 @@
+import asyncio
+import hmac
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import models
+from app.core.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+def new_code() -> str:
+    return f"{secrets.randbelow(900000) + 100000}"
+
+def codes_match(stored: str, code: str) -> bool:
+    """Constant-time compare. On bytes: compare_digest refuses non-ASCII str, and user input can be anything."""
+    return hmac.compare_digest(stored.encode("utf-8"), code.encode("utf-8"))
+
+class OTPStore:
+    """One live OTP per identifier (mobile or Aadhar number); a new request replaces the old code."""
+
+    def __init__(self, ttl: timedelta):
+        self.ttl = ttl
+
+    async def issue(self, db: AsyncSession, identifier: str) -> str: raise NotImplementedError
+    async def verify(self, db: AsyncSession, identifier: str, code: str) -> bool: raise NotImplementedError
+    async def discard(self, db: AsyncSession, identifier: str): raise NotImplementedError
+    async def purge(self) -> int: raise NotImplementedError
+
+    async def purge_forever(self, interval: float):
+        while True:
+            try:
+                purged = await self.purge()
+                if purged: logger.info(f"Purged {purged} expired OTPs")
+            except Exception as e:
+                logger.error(f"OTP purge failed: {e}")
+            await asyncio.sleep(interval)
+
+class MemoryOTPStore(OTPStore):
+    """Process-local, size-bounded (oldest identifiers evicted first). Single worker only."""
+
+    def __init__(self, ttl: timedelta, max_size: int):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._codes: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    async def issue(self, db: AsyncSession, identifier: str) -> str:
+        code = new_code()
+        self._codes.pop(identifier, None)
+        self._codes[identifier] = (code, time.time() + self.ttl.total_seconds())
+        while len(self._codes) > self.max_size:
+            self._codes.popitem(last=False)
+        return code
+
+    async def verify(self, db: AsyncSession, identifier: str, code: str) -> bool:
+        entry = self._codes.get(identifier)
+        if entry is None or entry[1] <= time.time(): return False
+        return codes_match(entry[0], code)
+
+    async def discard(self, db: AsyncSession, identifier: str):
+        self._codes.pop(identifier, None)
+
+    async def purge(self) -> int:
+        now = time.time()
+        stale = [k for k, (_, expires) in self._codes.items() if expires <= now]
+        for k in stale: del self._codes[k]
+        return len(stale)
+
+class DatabaseOTPStore(OTPStore):
+    """OTPTracker rows, looked up through ix_otps_identifier_expires and purged once expired."""
+
+    async def issue(self, db: AsyncSession, identifier: str) -> str:
+        code = new_code()
+        await db.execute(delete(models.OTPTracker).where(models.OTPTracker.identifier == identifier))
+        db.add(models.OTPTracker(identifier=identifier, otp_code=code, expires_at=datetime.utcnow() + self.ttl))
+        await db.commit()
+        return code
+
+    async def verify(self, db: AsyncSession, identifier: str, code: str) -> bool:
+        stored = await db.scalar(
+            select(models.OTPTracker.otp_code)
+            .filter(models.OTPTracker.identifier == identifier, models.OTPTracker.expires_at > datetime.utcnow())
+            .order_by(models.OTPTracker.expires_at.desc())
+        )
+        return stored is not None and codes_match(stored, code)
+
+    async def discard(self, db: AsyncSession, identifier: str):
+        await db.execute(delete(models.OTPTracker).where(models.OTPTracker.identifier == identifier))
+        await db.commit()
+
+    async def purge(self) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(models.OTPTracker).where(models.OTPTracker.expires_at <= datetime.utcnow()))
+            await db.commit()
+        return result.rowcount
+
+def create_otp_store(kind: str, ttl: timedelta, max_size: int) -> OTPStore:
+    if kind == "memory": return MemoryOTPStore(ttl, max_size)
+    if kind == "database": return DatabaseOTPStore(ttl)
+    raise ValueError(f"Unknown OTP_STORE: {kind}")
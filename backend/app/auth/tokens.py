@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete, select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core import models
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_TTL = timedelta(days=1)
+
+class TTLCache:
+    """Size-bounded dict whose entries expire at an absolute unix time."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None: return default
+        if entry[0] <= time.time():
+            del self._data[key]
+            return default
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0: return
+        self._data.pop(key, None)
+        self._data[key] = (time.time() + ttl, value)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str):
+        self._data.pop(key, None)
+
+    def purge(self) -> int:
+        now = time.time()
+        stale = [k for k, (expires, _) in self._data.items() if expires <= now]
+        for k in stale: del self._data[k]
+        return len(stale)
+
+    def __len__(self):
+        return len(self._data)
+
+# token sha256 -> revoked?  Revoked entries live until the token's own exp;
+# "not revoked" entries are re-checked against the DB after a short TTL so
+# logouts on other workers are picked up.
+revocations = TTLCache(settings.TOKEN_CACHE_SIZE)
+# JWT sub -> column snapshot of the User row
+principals = TTLCache(settings.TOKEN_CACHE_SIZE)
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def is_revoked(db: AsyncSession, token: str, exp: float) -> bool:
+    key = token_key(token)
+    cached = revocations.get(key)
+    if cached is not None: return cached
+    revoked = await db.scalar(select(models.TokenBlacklist.id).filter(models.TokenBlacklist.token == token)) is not None
+    remaining = exp - time.time()
+    revocations.set(key, revoked, remaining if revoked else min(remaining, settings.REVOCATION_RECHECK_TTL))
+    return revoked
+
+def revoke(token: str, exp: Optional[float]):
+    revocations.set(token_key(token), True, (exp - time.time()) if exp else ACCESS_TOKEN_TTL.total_seconds())
+
+def _snapshot(user: models.User) -> dict:
+    return {c.key: getattr(user, c.key) for c in models.User.__table__.columns}
+
+async def load_principal(db: AsyncSession, sub: str) -> Optional[models.User]:
+    """User for a JWT subject, served from cache and attached to `db` so handlers can still modify it."""
+    snap = principals.get(sub)
+    if snap is None:
+        user = await db.scalar(select(models.User).filter((models.User.username == sub) | (models.User.mobile_number == sub)))
+        if user: principals.set(sub, _snapshot(user), settings.PRINCIPAL_CACHE_TTL)
+        return user
+    user = models.User(**snap)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+def invalidate_principal(user: Optional[models.User]):
+    if user is None: return
+    for sub in (user.username, user.mobile_number):
+        if sub: principals.pop(sub)
+
+async def purge_blacklist():
+    """Delete blacklist rows whose token has expired anyway."""
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(delete(models.TokenBlacklist).where(or_(
+            models.TokenBlacklist.expires_at < now,
+            and_(models.TokenBlacklist.expires_at.is_(None), models.TokenBlacklist.blacklisted_at < now - ACCESS_TOKEN_TTL),
+        )))
+        await db.commit()
+    revocations.purge(); principals.purge()
+    return result.rowcount
+
+async def purge_blacklist_forever(interval: float):
+    while True:
+        try:
+            purged = await purge_blacklist()
+            if purged: logger.info(f"Purged {purged} expired blacklist rows")
+        except Exception as e:
+            logger.error(f"Blacklist purge failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,130 @@
+"""Frontend delivery: content-hashed, precompressed static assets.
+
+Everything under the frontend directory is read once at startup. Non-HTML files
+get a fingerprinted alias (js/main.<hash>.js) served with a one-year immutable
+Cache-Control, and HTML references are rewritten to those aliases. HTML itself
+is revalidated on every load. Compressible files are precompressed with gzip
+and, when the `brotli` package is installed, brotli; the smallest encoding the
+client accepts is sent. ETag / If-None-Match answers 304.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Dict, Mapping, Optional
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_BYTES = 512
+_REF = re.compile(r'(\b(?:src|href)=")([^"?#:]+)(")')
+
+class Asset:
+    __slots__ = ("body", "media_type", "digest", "cache_control", "encoded")
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str):
+        self.body = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.cache_control = cache_control
+        self.encoded: Dict[str, bytes] = {}  # "br" / "gzip" -> body, only when smaller
+        if media_type.startswith(COMPRESSIBLE) and len(body) >= MIN_COMPRESS_BYTES:
+            candidates = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli: candidates["br"] = brotli.compress(body, quality=11)
+            self.encoded = {k: v for k, v in candidates.items() if len(v) < len(body)}
+
+    def with_cache(self, cache_control: str) -> "Asset":
+        """Same bytes under different caching (the fingerprinted alias)."""
+        alias = Asset.__new__(Asset)
+        alias.body, alias.media_type, alias.digest, alias.encoded = self.body, self.media_type, self.digest, self.encoded
+        alias.cache_control = cache_control
+        return alias
+
+class StaticAssets:
+    def __init__(self, directory: str, index: str = "index.html"):
+        self.directory = directory
+        self.index = index
+        self.files: Dict[str, Asset] = {}
+        self.load()
+
+    @staticmethod
+    def fingerprint(path: str, digest: str) -> str:
+        stem, ext = posixpath.splitext(path)
+        return f"{stem}.{digest}{ext}"
+
+    def load(self):
+        files: Dict[str, Asset] = {}
+        aliases: Dict[str, str] = {}
+        html = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, self.directory).replace(os.sep, "/")
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                if media_type == "text/html":
+                    html.append((rel, full)); continue
+                with open(full, "rb") as f: asset = Asset(f.read(), media_type, REVALIDATE)
+                files[rel] = asset
+                aliases[rel] = self.fingerprint(rel, asset.digest)
+        for rel, hashed in aliases.items():
+            files[hashed] = files[rel].with_cache(IMMUTABLE)
+        for rel, full in html:
+            with open(full, encoding="utf-8") as f: text = f.read()
+            base = posixpath.dirname(rel)
+            def swap(m):
+                target = posixpath.normpath(posixpath.join(base, m.group(2)))
+                if target not in aliases: return m.group(0)
+                return m.group(1) + m.group(2)[:len(m.group(2)) - len(posixpath.basename(target))] + posixpath.basename(aliases[target]) + m.group(3)
+            files[rel] = Asset(_REF.sub(swap, text).encode("utf-8"), "text/html; charset=utf-8", REVALIDATE)
+        self.files = files
+        saved = sum(len(files[rel].body) - min(map(len, files[rel].encoded.values())) for rel in aliases if files[rel].encoded)
+        logger.info(f"Static assets: {len(files)} entries from {self.directory}, precompression saves {saved} bytes (brotli={'on' if brotli else 'off'})")
+
+    @staticmethod
+    def _accepted(header: str) -> Dict[str, float]:
+        """Accept-Encoding as {coding: q}; codings with q=0 are refused, `*` covers the ones not listed."""
+        out: Dict[str, float] = {}
+        for item in header.split(","):
+            coding, _, params = item.strip().partition(";")
+            if not coding: continue
+            q = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key.strip().lower() == "q":
+                    try: q = float(value)
+                    except ValueError: q = 0.0
+            out[coding.strip().lower()] = q
+        return out
+
+    @staticmethod
+    def _matches(if_none_match: str, etag: str) -> bool:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    def response(self, path: str, headers: Mapping[str, str]) -> Response:
+        path = posixpath.normpath("/" + path).lstrip("/")
+        if path in ("", "."): path = self.index
+        asset: Optional[Asset] = self.files.get(path) or self.files.get(posixpath.join(path, self.index))
+        if asset is None: return Response("Not Found", status_code=404, media_type="text/plain")
+
+        accepted = self._accepted(headers.get("accept-encoding", ""))
+        encoding = next((e for e in ("br", "gzip") if e in asset.encoded and accepted.get(e, accepted.get("*", 0)) > 0), None)
+        etag = f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"'
+        out = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if asset.encoded: out["Vary"] = "Accept-Encoding"
+        if self._matches(headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=out)
+        if encoding: out["Content-Encoding"] = encoding
+        return Response(asset.encoded[encoding] if encoding else asset.body, media_type=asset.media_type, headers=out)
@@ -5,6 +5,90 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "WebRTC Video Conference"
     JWT_SECRET_KEY: str = "your-super-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
+
+    # Database. ASYNC_DATABASE_URL is derived from DATABASE_URL when empty.
+    DATABASE_URL: str = "sqlite:///./kyc_database.db"
+    ASYNC_DATABASE_URL: str = ""
+    # Serializes startup schema setup between workers on this host
+    SCHEMA_LOCK_FILE: str = "/tmp/kyc-schema.lock"
+    # Pool tuning for server databases (PostgreSQL/MySQL)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # SQLite: WAL journal plus a busy timeout so concurrent writers wait instead of failing
+    SQLITE_WAL: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # bcrypt worker pool ("thread" or "process")
+    HASH_POOL_KIND: str = "thread"
+    HASH_POOL_WORKERS: int = 4
+
+    # Room registry: "memory" (single worker) or "local" (Unix socket hub shared by workers)
+    ROOM_REGISTRY: str = "memory"
+    ROOM_REGISTRY_SOCKET: str = "/tmp/kyc-rooms.sock"
+    # Max frames buffered per WebSocket before a slow peer is disconnected
+    WS_OUTBOUND_QUEUE: int = 256
+    # Largest room frame (SDP, chat...) relayed to the peer; bigger ones are dropped
+    WS_MAX_FRAME_BYTES: int = 1024 * 1024
+    # Server-side trickle ICE coalescing window (0 disables)
+    ICE_BATCH_WINDOW_MS: int = 40
+    # Heartbeat: idle room sockets get a {"type": "ping"} every interval; silent ones are reaped after the timeout (seconds)
+    WS_HEARTBEAT_INTERVAL: int = 15
+    WS_IDLE_TIMEOUT: int = 45
+    # Rooms held by one worker; new rooms beyond this are refused with 1013 (0 = unlimited)
+    MAX_ACTIVE_ROOMS: int = 1000
+    # Write-behind room event journal: "file" (NDJSON segments in JOURNAL_DIR), "database" (session_events) or "off"
+    JOURNAL: str = "file"
+    JOURNAL_DIR: str = "~/.local/share/kyc/journal"
+    JOURNAL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    # Retention (0 disables one): segments/rows older than this many days, and segments beyond this total size
+    JOURNAL_RETENTION_DAYS: float = 30
+    JOURNAL_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    JOURNAL_QUEUE: int = 10000  # events buffered before new ones are dropped
+    JOURNAL_BATCH: int = 500
+    JOURNAL_FLUSH_MS: int = 200
+
+    # Rate limits: token buckets per minute (0 disables one), LRU-bounded key tables
+    RATE_LIMIT_OTP_PER_MIN: float = 3  # OTP sends per mobile/Aadhar number
+    RATE_LIMIT_OTP_VERIFY_PER_MIN: float = 10  # OTP guesses per mobile/Aadhar number
+    RATE_LIMIT_LOGIN_PER_MIN: float = 10  # login attempts per identifier
+    RATE_LIMIT_IP_PER_MIN: float = 120  # OTP + login calls per client IP
+    RATE_LIMIT_WS_PER_MIN: float = 30  # room joins per client IP
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    TRUST_FORWARDED_FOR: bool = False  # take the client IP from X-Forwarded-For (only behind a trusted proxy)
+    # Concurrent logins (bcrypt) admitted before shedding with 429
+    LOGIN_MAX_CONCURRENT: int = 64
+
+    # Auth caches (seconds)
+    TOKEN_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: int = 30
+    REVOCATION_RECHECK_TTL: int = 30
+    BLACKLIST_PURGE_INTERVAL: int = 3600
+
+    # OTP store: "database" (shared by workers) or "memory" (single worker, bounded)
+    OTP_STORE: str = "database"
+    OTP_MAX_ENTRIES: int = 100000
+
+    # Content-addressed store for KYC capture images
+    CAPTURE_STORAGE_DIR: str = "./captures"
+    CAPTURE_MAX_BYTES: int = 10 * 1024 * 1024
+    # Background transcoding (needs Pillow): "webp" or "jpeg"
+    CAPTURE_FORMAT: str = "webp"
+    CAPTURE_QUALITY: int = 80
+    CAPTURE_THUMB_PX: int = 320
+    CAPTURE_WORKERS: int = 2
+    # Unreferenced blobs (e.g. originals replaced by transcoding) are deleted once untouched this long (seconds)
+    CAPTURE_GC_INTERVAL: int = 3600
+    CAPTURE_GC_GRACE: int = 3600
+
+    # Agent queue push feed coalescing window
+    QUEUE_FEED_WINDOW_MS: int = 100
+
+    # Server-side dispatcher: hands the oldest online customer to the next idle agent
+    DISPATCH_ENABLED: bool = False
+    DISPATCH_PRIORITY: str = "KYC,LOAN_APPROVAL,ACCOUNT_OPENING,CARD_ISSUANCE,CARD_BLOCKING"
     
     # Pydantic v2 style configuration
     model_config = SettingsConfigDict(
@@ -1,14 +1,137 @@
-from sqlalchemy import create_engine
+import time
+from collections import deque
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import instrument_engine
+
+# sync driver -> asyncio driver
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme.split("+")[0], scheme) + sep + rest
+
+def engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def sqlite_pragmas(wal: bool, busy_timeout_ms: int):
+    pragmas = [f"PRAGMA busy_timeout={busy_timeout_ms}", "PRAGMA temp_store=MEMORY", "PRAGMA cache_size=-20000"]
+    if wal:
+        # WAL: readers never block the writer; NORMAL sync is durable across app crashes in WAL mode
+        pragmas += ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"]
+    return pragmas
+
+def tune_sqlite(sync_engine, wal: bool, busy_timeout_ms: int):
+    pragmas = sqlite_pragmas(wal, busy_timeout_ms)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas: cursor.execute(pragma)
+        cursor.close()
+
+class PoolStats:
+    """Connection checkouts and how long sessions waited for one.
+
+    Wait is measured from the moment a session starts its transaction to the
+    moment it holds a connection, so it covers pool queueing and new connects.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.engines = []
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.connects = 0
+        self.sessions_open = 0
+        self.peak_sessions_open = 0
+        self.waits = deque(maxlen=window)
+        self._started = {}
+
+    def attach(self, sync_engine):
+        self.engines.append(sync_engine)
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+
+    def track_sessions(self, session_class=Session):
+        # Session events are class-level, so this covers sync sessions and the ones behind AsyncSession
+        event.listen(session_class, "after_transaction_create", self._on_transaction_create)
+        event.listen(session_class, "after_begin", self._on_begin)
+        event.listen(session_class, "after_transaction_end", self._on_transaction_end)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./kyc_database.db"
+    def _on_connect(self, dbapi_connection, connection_record): self.connects += 1
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1; self.checked_out += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record): self.checked_out -= 1
+
+    def _on_transaction_create(self, session, transaction):
+        if transaction.parent is None:
+            self._started[id(transaction)] = time.perf_counter()
+            self.sessions_open += 1
+            self.peak_sessions_open = max(self.peak_sessions_open, self.sessions_open)
+
+    def _on_begin(self, session, transaction, connection):
+        started = self._started.pop(id(transaction), None)
+        if started is not None: self.waits.append(time.perf_counter() - started)
+
+    def _on_transaction_end(self, session, transaction):
+        if transaction.parent is None:
+            self._started.pop(id(transaction), None)
+            self.sessions_open -= 1
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.waits)
+        pick = lambda pct: round(ordered[min(len(ordered) - 1, int(pct * len(ordered)))] * 1000, 2) if ordered else 0.0
+        return {
+            "checked_out": self.checked_out, "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts, "connects": self.connects,
+            "sessions_open": self.sessions_open, "peak_sessions_open": self.peak_sessions_open,
+            "checkout_wait_ms": {"n": len(ordered), "p50": pick(0.5), "p95": pick(0.95), "max": pick(1.0)},
+            "pools": [e.pool.status() for e in self.engines],
+        }
+
+pool_stats = PoolStats()
+pool_stats.track_sessions()
+
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+ASYNC_SQLALCHEMY_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_url(SQLALCHEMY_DATABASE_URL)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async path used by the request handlers so queries never block the event loop
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    tune_sqlite(engine, settings.SQLITE_WAL, settings.SQLITE_BUSY_TIMEOUT_MS)
+    tune_sqlite(async_engine.sync_engine, settings.SQLITE_WAL, settings.SQLITE_BUSY_TIMEOUT_MS)
+pool_stats.attach(engine)
+pool_stats.attach(async_engine.sync_engine)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -17,3 +140,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Async drop-in for get_db()."""
+    async with AsyncSessionLocal() as db:
+        yield db
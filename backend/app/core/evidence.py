@@ -0,0 +1,102 @@
+import asyncio
+import mimetypes
+import os
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional
+
+from sqlalchemy import Select, select
+
+from app.core import models
+from app.core.database import AsyncSessionLocal
+from app.core.storage import iter_base64, split_data_url
+from app.signaling import codec
+
+CHUNK = 64 * 1024
+SESSION_BATCH = 100
+
+class _Sink:
+    """Write-only file object for ZipFile. Without tell()/seek() zipfile switches to streaming mode
+    (data descriptors after each member), and we hand out whatever it has written so far."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self): pass
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _read_file(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK): yield chunk
+
+def safe_name(name: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in name)
+
+def _member_name(folder: str, c, mime: str) -> str:
+    ext = mimetypes.guess_extension(mime or "") or ".bin"
+    return f"{folder}/{c.id}-{safe_name(c.label or 'capture')}{ext}"
+
+async def _capture_chunks(c) -> AsyncIterator[bytes]:
+    if c.storage_path:
+        reader = _read_file(c.storage_path)
+        while chunk := await asyncio.to_thread(next, reader, b""): yield chunk
+        return
+    # Legacy row: load just this one base64 column and decode it piecewise
+    async with AsyncSessionLocal() as db:
+        data = await db.scalar(select(models.Capture.image_base64).filter(models.Capture.id == c.id)) or ""
+    for chunk in iter_base64(data, split_data_url(data)[1]): yield chunk
+
+async def bundle(sessions: Select) -> AsyncIterator[bytes]:
+    """ZIP of `<room_id>/<capture>.<ext>` plus `<room_id>/manifest.json` for every session matched by
+    `sessions` (a select of KYCSession). Sessions are paged by id and captures fetched one at a time,
+    so memory stays at one chunk plus one batch of session rows."""
+    sink = _Sink()
+    zf = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            batch = (await db.scalars(sessions.filter(models.KYCSession.id > last_id).order_by(models.KYCSession.id).limit(SESSION_BATCH))).all()
+        if not batch: break
+        last_id = batch[-1].id
+        for s in batch:
+            async with AsyncSessionLocal() as db:
+                captures = (await db.execute(select(
+                    models.Capture.id, models.Capture.label, models.Capture.storage_path, models.Capture.mime_type,
+                    models.Capture.content_hash, models.Capture.size_bytes, models.Capture.timestamp,
+                ).filter(models.Capture.session_id == s.id).order_by(models.Capture.id))).all()
+            folder, files = safe_name(s.room_id), []
+            for c in captures:
+                mime = c.mime_type or "image/png"
+                name = _member_name(folder, c, mime)
+                entry = {"capture_id": c.id, "label": c.label, "file": name.split("/", 1)[1], "mime_type": mime,
+                         "sha256": c.content_hash, "bytes": 0, "captured_at": _iso(c.timestamp)}
+                files.append(entry)
+                if c.storage_path and not os.path.exists(c.storage_path):
+                    entry["file"], entry["missing"] = None, True
+                    continue
+                info = zipfile.ZipInfo(name, date_time=(c.timestamp or datetime.utcnow()).timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED  # images are already compressed
+                with zf.open(info, "w", force_zip64=True) as member:
+                    async for chunk in _capture_chunks(c):
+                        member.write(chunk); entry["bytes"] += len(chunk)
+                        if sink.parts: yield sink.drain()
+            manifest = {
+                "room_id": s.room_id, "session_id": s.id, "service_type": s.service_type, "status": s.status,
+                "customer_id": s.customer_id, "agent_id": s.agent_id,
+                "requested_at": _iso(s.requested_at), "accepted_at": _iso(s.accepted_at), "updated_at": _iso(s.updated_at),
+                "captures": files,
+            }
+            zf.writestr(f"{folder}/manifest.json", codec.dumps(manifest))
+            yield sink.drain()
+    zf.close()
+    yield sink.drain()
@@ -0,0 +1,48 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select
+
+from app.core.database import AsyncSessionLocal
+from app.core.pagination import encode_cursor
+from app.signaling import codec
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def keyset_page_query(q: Select, id_col, cursor_id: Optional[int], limit: int) -> Select:
+    if cursor_id is not None: q = q.filter(id_col > cursor_id)
+    return q.order_by(id_col).limit(limit)
+
+async def page(db, q: Select, id_col, cursor_id: Optional[int], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """One id-ordered page of projected rows plus the next cursor (None on the last page)."""
+    rows = [dict(r._mapping) for r in (await db.execute(keyset_page_query(q, id_col, cursor_id, limit + 1))).all()]
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def stream_rows(q: Select, id_col, columns: Sequence[str], fmt: str, batch: int = 1000) -> AsyncIterator[str]:
+    """Walk `q` in id-ordered batches, each in its own short session, yielding NDJSON lines or CSV rows.
+
+    Memory stays at one batch regardless of table size, and no connection is held between batches.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt == "csv":
+        writer.writerow(columns)
+        yield buf.getvalue(); buf.seek(0); buf.truncate()
+    last_id = None
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(keyset_page_query(q, id_col, last_id, batch))).all()
+        if not rows: return
+        if fmt == "csv":
+            writer.writerows([[_plain(v) for v in r] for r in rows])
+            yield buf.getvalue(); buf.seek(0); buf.truncate()
+        else:
+            yield "".join(codec.dumps({c: _plain(v) for c, v in zip(columns, r)}) + "\n" for r in rows)
+        if len(rows) < batch: return
+        last_id = rows[-1]._mapping["id"]
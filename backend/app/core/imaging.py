@@ -0,0 +1,154 @@
+"""Background capture processing: transcode to a compact format and build gallery thumbnails.
+
+Needs Pillow. Without it captures are kept exactly as uploaded.
+"""
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from app.core import models
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.storage import BlobStore, capture_store
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+def transcode(path: str, fmt: str, quality: int, thumb_px: int) -> Tuple[bytes, bytes]:
+    """Blocking; returns (full image, thumbnail) encoded as `fmt`."""
+    with Image.open(path) as img:
+        img = img.convert("RGB")  # drops alpha; JPEG/WebP lossy frames of a video call never need it
+        full = io.BytesIO()
+        img.save(full, format=fmt.upper(), quality=quality, optimize=True)
+        img.thumbnail((thumb_px, thumb_px))
+        thumb = io.BytesIO()
+        img.save(thumb, format=fmt.upper(), quality=max(quality - 10, 40))
+    return full.getvalue(), thumb.getvalue()
+
+class CaptureProcessor:
+    """Bounded job queue consumed by a few tasks that push the CPU work into a thread pool."""
+
+    def __init__(self, store: BlobStore, workers: int, fmt: str, quality: int, thumb_px: int, max_queue: int = 1000):
+        self.store = store
+        self.workers = max(1, workers)
+        self.fmt = fmt.lower()
+        self.quality = quality
+        self.thumb_px = thumb_px
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.bytes_saved = 0
+        self.reclaimed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and self.fmt in MIME_TYPES
+
+    async def start(self):
+        if not self.enabled:
+            logger.warning("Capture processing disabled (Pillow missing or unsupported CAPTURE_FORMAT)")
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="capture")
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        # Pick up captures left unprocessed by a previous run, oldest first (failed ones are marked processed and stay out)
+        async with AsyncSessionLocal() as db:
+            ids = (await db.scalars(select(models.Capture.id).filter(models.Capture.processed_at.is_(None), models.Capture.storage_path.isnot(None))
+                                    .order_by(models.Capture.id).limit(self.queue.maxsize))).all()
+        for capture_id in ids: self.submit(capture_id)
+
+    async def stop(self):
+        for t in self._tasks: t.cancel()
+        if self._executor: self._executor.shutdown(wait=False)
+
+    def submit(self, capture_id: int):
+        if not self.enabled: return
+        try:
+            self.queue.put_nowait(capture_id)
+        except asyncio.QueueFull:
+            logger.warning(f"Capture queue full; capture {capture_id} stays unprocessed until restart")
+
+    async def _consume(self):
+        while True:
+            capture_id = await self.queue.get()
+            try:
+                await self.process(capture_id)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Capture {capture_id} processing failed: {e}")
+                await self._mark_failed(capture_id, e)
+
+    async def _mark_failed(self, capture_id: int, error: Exception):
+        """Record the failure so the capture is not retried on every restart; it is served as uploaded."""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(models.Capture).where(models.Capture.id == capture_id, models.Capture.processed_at.is_(None))
+                                 .values(processed_at=datetime.utcnow(), process_error=(str(error) or type(error).__name__)[:500]))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Could not mark capture {capture_id} as failed: {e}")
+
+    async def process(self, capture_id: int):
+        loop = asyncio.get_running_loop()
+        async with AsyncSessionLocal() as db:
+            c = await db.get(models.Capture, capture_id)
+            if not c or not c.storage_path or c.processed_at: return
+            source_path, original_size = c.storage_path, c.size_bytes
+        # No session held while transcoding and writing blobs
+        full, thumb = await loop.run_in_executor(self._executor, transcode, source_path, self.fmt, self.quality, self.thumb_px)
+        smaller = len(full) < (original_size or 0)
+        if smaller: full_blob = await loop.run_in_executor(self._executor, self.store.put_bytes, full)
+        thumb_hash, thumb_path, _ = await loop.run_in_executor(self._executor, self.store.put_bytes, thumb)
+        async with AsyncSessionLocal() as db:
+            c = await db.get(models.Capture, capture_id)
+            if not c or c.processed_at or c.storage_path != source_path: return  # gone or handled meanwhile; GC takes the new blobs
+            if smaller:
+                c.content_hash, c.storage_path, c.size_bytes = full_blob
+                c.mime_type = MIME_TYPES[self.fmt]
+            c.thumb_hash, c.thumb_path, c.thumb_mime_type = thumb_hash, thumb_path, MIME_TYPES[self.fmt]
+            c.original_size_bytes = original_size
+            c.processed_at = datetime.utcnow()
+            await db.commit()
+        # The replaced original is left to collect_garbage: deleting it here would race uploads deduping onto it
+        if smaller: self.bytes_saved += (original_size or 0) - full_blob[2]
+
+    async def collect_garbage(self, grace: float, batch: int = 500) -> int:
+        """Delete blobs no capture references (image or thumbnail) that nobody wrote or deduped against for `grace` seconds."""
+        digests = await asyncio.to_thread(lambda: list(self.store.stale(grace)))
+        removed = 0
+        for i in range(0, len(digests), batch):
+            chunk = digests[i:i + batch]
+            async with AsyncSessionLocal() as db:
+                used = set((await db.scalars(select(models.Capture.content_hash).filter(models.Capture.content_hash.in_(chunk)))).all())
+                used.update((await db.scalars(select(models.Capture.thumb_hash).filter(models.Capture.thumb_hash.in_(chunk)))).all())
+            for digest in chunk:
+                if digest not in used and await asyncio.to_thread(self.store.reclaim, digest, grace): removed += 1
+        self.reclaimed += removed
+        return removed
+
+    async def gc_forever(self, interval: float, grace: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await self.collect_garbage(grace)
+                if removed: logger.info(f"Blob GC removed {removed} unreferenced blobs")
+            except Exception as e:
+                logger.error(f"Blob GC failed: {e}")
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "format": self.fmt, "queued": self.queue.qsize(), "processed": self.processed, "failed": self.failed, "bytes_saved": self.bytes_saved, "reclaimed": self.reclaimed}
+
+capture_processor = CaptureProcessor(capture_store, settings.CAPTURE_WORKERS, settings.CAPTURE_FORMAT, settings.CAPTURE_QUALITY, settings.CAPTURE_THUMB_PX)
@@ -0,0 +1,161 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+# Prometheus text exposition without the client library: a dict lookup and a
+# bisect per observation, no locks (everything records from the event loop or
+# under the GIL where a lost increment is acceptable).
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SQL_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"}
+
+Labels = Tuple[str, ...]
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra: pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Labels, list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, labels: Labels = ()):
+        row = self.values.get(labels)
+        if row is None: row = self.values[labels] = [0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, row in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', le))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(row[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+class Gauge:
+    """Read at scrape time from `collect`, which returns {labels: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Dict[Labels, float]], labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames, self.collect = name, help, labelnames, collect
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect().items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, collect: Callable[[], Dict[Labels, float]], labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.add(Gauge(name, help, collect, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in list(self.metrics.values()):
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            try: lines.extend(m.samples())
+            except Exception as e: lines.append(f"# {m.name} collection failed: {e!r}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_seconds = registry.histogram("kyc_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+ws_messages = registry.counter("kyc_ws_messages_total", "Signaling frames received by ws_end, by type.", ("type",))
+ws_outbox_seconds = registry.histogram("kyc_ws_outbox_send_seconds", "Time a frame spends in a peer's outbox until it is written to the socket.")
+ws_reaped = registry.counter("kyc_ws_reaped_total", "Room sockets closed by the heartbeat reaper, by role.", ("role",))
+ws_oversize = registry.counter("kyc_ws_oversize_total", "Room frames dropped for exceeding WS_MAX_FRAME_BYTES.")
+ws_outbox_dropped = registry.counter("kyc_ws_outbox_dropped_total", "Frames refused because a peer's outbox was full.")
+db_query_seconds = registry.histogram("kyc_db_query_duration_seconds", "SQL statement execution time by verb.", ("verb",))
+capture_bytes = registry.counter("kyc_capture_bytes_total", "Capture bytes ingested, by endpoint.", ("source",))
+captures = registry.counter("kyc_captures_total", "Captures ingested, by endpoint.", ("source",))
+rate_limited = registry.counter("kyc_rate_limited_total", "Requests refused by a token bucket, by limiter.", ("limiter",))
+admission_shed = registry.counter("kyc_admission_shed_total", "Requests shed by a concurrency cap, by gate.", ("gate",))
+journal_events = registry.counter("kyc_journal_events_total", "Room events written by the event journal.")
+journal_dropped = registry.counter("kyc_journal_dropped_total", "Room events dropped because the journal queue was full.")
+journal_flush_seconds = registry.histogram("kyc_journal_flush_seconds", "Time to write one journal batch to its sink.")
+hash_seconds = registry.histogram("kyc_bcrypt_seconds", "bcrypt run time in the hashing pool (excludes queueing).", ("op",), buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0))
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests. Labels use the matched route template, not the raw path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http": return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start": status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.observe(time.perf_counter() - started, (scope["method"], path, str(status[0])))
+
+def instrument_engine(sync_engine):
+    """Time every cursor execute on this engine (use async_engine.sync_engine for the async one)."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        verb = statement.lstrip()[:9].split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        if verb not in SQL_VERBS: verb = "OTHER"
+        db_query_seconds.observe(time.perf_counter() - started, (verb,))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        if context.connection is not None and context.connection.info.get("query_start"):
+            context.connection.info["query_start"].pop()
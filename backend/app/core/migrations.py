@@ -0,0 +1,65 @@
+"""Idempotent schema upgrade for databases created by an older build.
+
+create_all() only creates missing tables; it never touches a table that
+exists. upgrade() runs after it and brings existing tables up to the
+models: missing columns are added (ALTER TABLE ... ADD COLUMN, always
+nullable, no server default) and missing indexes are created. A few new
+columns are backfilled from existing data. Running it again is a no-op.
+
+prepare() is what the app runs at import, i.e. once per uvicorn worker: it
+holds a lock file around both steps so workers on one host take turns, and
+retries when DDL loses a race anyway (another host, or no shared /tmp).
+"""
+import fcntl
+import logging
+from typing import List
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+logger = logging.getLogger(__name__)
+
+# Messages of DDL that raced with an identical statement (SQLite, PostgreSQL, MySQL)
+LOST_RACE = ("already exists", "duplicate column")
+
+# (table, column) -> statement run once, right after that column is added
+BACKFILLS = {
+    ("kyc_sessions", "updated_at"): "UPDATE kyc_sessions SET updated_at = requested_at WHERE updated_at IS NULL",
+}
+
+def upgrade(engine: Engine, metadata: MetaData) -> List[str]:
+    """Returns what was changed, e.g. ["captures.processed_at", "index ix_captures_session_id"]."""
+    changes: List[str] = []
+    with engine.begin() as conn:
+        insp = inspect(conn)
+        existing_tables = set(insp.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables: continue
+            present = {c["name"] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present: continue
+                ddl_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl_type}'))
+                backfill = BACKFILLS.get((table.name, column.name))
+                if backfill: conn.execute(text(backfill))
+                changes.append(f"{table.name}.{column.name}")
+            indexes = {i["name"] for i in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in indexes: continue
+                index.create(conn)
+                changes.append(f"index {index.name}")
+    if changes: logger.info(f"Schema upgraded: {', '.join(changes)}")
+    return changes
+
+def prepare(engine: Engine, metadata: MetaData, lock_path: str, attempts: int = 3) -> List[str]:
+    """create_all() + upgrade() under an exclusive lock on `lock_path`."""
+    with open(lock_path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+        for attempt in range(attempts):
+            try:
+                metadata.create_all(bind=engine)
+                return upgrade(engine, metadata)
+            except (OperationalError, ProgrammingError) as e:
+                if attempt == attempts - 1 or not any(m in str(e.orig).lower() for m in LOST_RACE): raise
+                logger.info(f"Schema setup raced with another process, re-checking: {e.orig}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index
 from .database import Base
 from datetime import datetime
 
@@ -40,7 +40,7 @@ class Card(Base):
 class LoanApplication(Base):
     __tablename__ = "loans"
     id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("users.id"))
+    customer_id = Column(Integer, ForeignKey("users.id"), index=True)
     amount = Column(Integer)
     purpose = Column(String)
     status = Column(String, default="pending") 
@@ -50,13 +50,15 @@ class LoanApplication(Base):
 class Ticket(Base):
     __tablename__ = "tickets"
     id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("users.id"))
+    customer_id = Column(Integer, ForeignKey("users.id"), index=True)
     subject = Column(String)
     description = Column(Text)
     status = Column(String, default="open") # open, resolved
     agent_feedback = Column(Text, nullable=True) # NEW: Feedback from Agent
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (Index("ix_tickets_status_id", "status", "id"),)
+
 class KYCSession(Base):
     __tablename__ = "kyc_sessions"
     id = Column(Integer, primary_key=True, index=True)
@@ -66,13 +68,48 @@ class KYCSession(Base):
     service_type = Column(String) # KYC, ACCOUNT_OPENING, LOAN_APPROVAL, CARD_ISSUANCE, CARD_BLOCKING
     status = Column(String, default="requested")
     requested_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    accepted_at = Column(DateTime, nullable=True) # set when an agent claims the session
+
+    __table_args__ = (
+        # Agent queue: oldest-first scans of "requested", optionally per service type
+        Index("ix_kyc_sessions_status_requested", "status", "requested_at", "id"),
+        Index("ix_kyc_sessions_status_service_requested", "status", "service_type", "requested_at", "id"),
+    )
+
+class KYCSessionRemoval(Base):
+    """Tombstone for deleted sessions so the pending-queue change feed can report them."""
+    __tablename__ = "kyc_session_removals"
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(String, index=True)
+    removed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class SessionEvent(Base):
+    """Append-only room journal (joins, leaves, chat, purges), written in batches by app.signaling.journal."""
+    __tablename__ = "session_events"
+    id = Column(Integer, primary_key=True)
+    at = Column(DateTime, default=datetime.utcnow, index=True)
+    room_id = Column(String, index=True)
+    kind = Column(String)
+    role = Column(String, nullable=True)
+    payload = Column(Text, nullable=True) # raw chat frame
 
 class Capture(Base):
     __tablename__ = "captures"
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("kyc_sessions.id"))
+    session_id = Column(Integer, ForeignKey("kyc_sessions.id"), index=True)
     label = Column(String)
-    image_base64 = Column(Text)
+    image_base64 = Column(Text, nullable=True) # legacy rows only; new captures live in the blob store
+    content_hash = Column(String(64), index=True, nullable=True) # sha256 of the raw image bytes
+    storage_path = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    mime_type = Column(String, nullable=True)
+    original_size_bytes = Column(Integer, nullable=True) # size as uploaded, before transcoding
+    thumb_hash = Column(String(64), index=True, nullable=True)
+    thumb_path = Column(String, nullable=True)
+    thumb_mime_type = Column(String, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+    process_error = Column(String, nullable=True) # set (with processed_at) when transcoding failed; the upload is kept as is
     timestamp = Column(DateTime, default=datetime.utcnow)
 
 class OTPTracker(Base):
@@ -80,10 +117,13 @@ class OTPTracker(Base):
     id = Column(Integer, primary_key=True, index=True)
     identifier = Column(String, index=True)
     otp_code = Column(String)
-    expires_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
+
+    __table_args__ = (Index("ix_otps_identifier_expires", "identifier", "expires_at"),)
 
 class TokenBlacklist(Base):
     __tablename__ = "token_blacklist"
     id = Column(Integer, primary_key=True, index=True)
     token = Column(String, unique=True, index=True)
     blacklisted_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True, index=True) # token exp; row can be purged after this
@@ -0,0 +1,38 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+def encode_cursor(*parts) -> str:
+    raw = "|".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, count: int) -> Tuple[str, ...]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+    parts = tuple(raw.split("|"))
+    if len(parts) != count: raise HTTPException(400, "Invalid cursor")
+    return parts
+
+def after_id(cursor: Optional[str]) -> Optional[int]:
+    """Last id encoded in an id-only cursor (see app.core.export.page)."""
+    if not cursor: return None
+    try:
+        return int(decode_cursor(cursor, 1)[0])
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+def after(sort_col, id_col, cursor: Optional[str], sort_type=datetime):
+    """Keyset predicate: rows strictly after (sort value, id) encoded in `cursor`."""
+    if not cursor: return None
+    value, row_id = decode_cursor(cursor, 2)
+    try:
+        value = sort_type.fromisoformat(value) if sort_type is datetime else sort_type(value)
+        row_id = int(row_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return or_(sort_col > value, and_(sort_col == value, id_col > row_id))
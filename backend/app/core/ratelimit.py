@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.core import metrics
+
+class RateLimiter:
+    """Token bucket per key (identifier, IP...). `per_minute` tokens refill per minute, up to `burst`.
+
+    Keys live in an LRU capped at `max_keys`; an evicted key simply starts over with a full bucket.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: Optional[float] = None, max_keys: int = 100000):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst if burst is not None else max(per_minute, 1)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # key -> [tokens, last refill]
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    def hit(self, key: str) -> float:
+        """Take one token. Returns 0 if allowed, otherwise seconds until a token is available."""
+        if self.rate <= 0: self.allowed += 1; return 0.0  # disabled
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False); self.evicted += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0.0
+        self.limited += 1
+        metrics.rate_limited.inc((self.name,))
+        return (1 - bucket[0]) / self.rate
+
+    def check(self, key: str):
+        """hit() that raises 429 with Retry-After."""
+        retry = self.hit(key)
+        if retry: raise HTTPException(429, detail="Too many requests", headers={"Retry-After": str(int(retry) + 1)})
+
+    def stats(self) -> dict:
+        return {"per_minute": round(self.rate * 60, 2), "burst": self.burst, "keys": len(self._buckets), "max_keys": self.max_keys,
+                "allowed": self.allowed, "limited": self.limited, "evicted": self.evicted}
+
+class AdmissionGate:
+    """Caps concurrent executions of an expensive route. Over the cap, requests are shed with 429
+    instead of queueing behind the ones already running."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def __enter__(self):
+        if self.limit and self.in_flight >= self.limit:
+            self.shed += 1
+            metrics.admission_shed.inc((self.name,))
+            raise HTTPException(429, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+        self.in_flight += 1; self.admitted += 1
+        self.peak = max(self.peak, self.in_flight)
+        return self
+
+    def __exit__(self, *exc):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "peak": self.peak, "admitted": self.admitted, "shed": self.shed}
+
+def client_ip(request_or_ws, trust_forwarded: bool = False) -> str:
+    """Peer address; with `trust_forwarded`, the first X-Forwarded-For hop (only behind a trusted proxy)."""
+    if trust_forwarded:
+        forwarded = request_or_ws.headers.get("x-forwarded-for")
+        if forwarded: return forwarded.split(",")[0].strip()
+    return request_or_ws.client.host if request_or_ws.client else "unknown"
+
+def snapshot(limiters: List[RateLimiter], gates: List[AdmissionGate]) -> Dict[str, dict]:
+    return {"limiters": {l.name: l.stats() for l in limiters}, "gates": {g.name: g.stats() for g in gates}}
@@ -67,12 +67,51 @@ class ServiceDecision(BaseModel):
 class AdminApprove(BaseModel):
     agent_id: int
     approve: bool
+class BulkServiceDecision(BaseModel):
+    decisions: List[ServiceDecision] = Field(..., min_length=1, max_length=500)
+class BulkAdminApprove(BaseModel):
+    approvals: List[AdminApprove] = Field(..., min_length=1, max_length=500)
+
+class UserOut(BaseModel):
+    """Admin listing row. Credentials (hashed_password / hashed_mpin) are never selected."""
+    id: int
+    username: Optional[str] = None
+    mobile_number: Optional[str] = None
+    aadhar_number: Optional[str] = None
+    pan_number: Optional[str] = None
+    role: Optional[str] = None
+    is_mpin_set: Optional[bool] = None
+    is_mobile_verified: Optional[bool] = None
+    is_aadhar_verified: Optional[bool] = None
+    is_pan_verified: Optional[bool] = None
+    video_kyc_status: Optional[str] = None
+    is_admin_approved: Optional[bool] = None
+class TicketOut(BaseModel):
+    id: int
+    customer_id: Optional[int] = None
+    subject: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    agent_feedback: Optional[str] = None
+    created_at: Optional[datetime] = None
 
 # --- Live Session ---
 class CaptureLog(BaseModel):
     room_id: str
     label: str
     image_data: str
+class PendingSession(BaseModel):
+    room_id: str
+    service_type: Optional[str] = None
+    status: str
+    is_customer_online: bool
+    requested_at: Optional[datetime] = None
+
+class PendingChanges(BaseModel):
+    changed: List[PendingSession] # status != "requested" means it left the queue
+    removed: List[str]
+    cursor: str
+
 class RoomStatus(BaseModel):
     room_id: str
     is_active: bool
@@ -0,0 +1,159 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+B64_CHUNK = 64 * 1024  # multiple of 4 so every slice decodes on its own
+
+class PayloadTooLarge(Exception):
+    pass
+
+def split_data_url(data: str) -> Tuple[Optional[str], int]:
+    """Returns (mime_type, offset of the base64 payload) for 'data:image/png;base64,...' strings."""
+    if data.startswith("data:"):
+        comma = data.find(",", 0, 256)
+        if comma != -1:
+            return data[5:comma].split(";")[0] or None, comma + 1
+    return None, 0
+
+def base64_size(data: str, offset: int = 0) -> int:
+    """Decoded size of the base64 payload starting at `offset`, without decoding it."""
+    n = len(data) - offset
+    return n * 3 // 4 - (data.endswith("==") + data.endswith("="))
+
+async def capped(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """Pass a byte stream through, raising PayloadTooLarge as soon as more than `max_bytes` went by."""
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > max_bytes: raise PayloadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        yield chunk
+
+def iter_base64(data: str, offset: int = 0) -> Iterator[bytes]:
+    for i in range(offset, len(data), B64_CHUNK):
+        yield base64.b64decode(data[i:i + B64_CHUNK])
+
+class BlobWriter:
+    """Streams bytes to a temp file while hashing; commit() moves it to its content address."""
+
+    def __init__(self, store: "BlobStore"):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self._tmp = tempfile.mkstemp(dir=store.tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> Tuple[str, str]:
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = self.store.path_for(digest)
+        try:
+            # Dedupe: identical frame already stored. The fresh mtime keeps the GC sweep off it (see reclaim)
+            os.utime(path)
+            os.unlink(self._tmp)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp, path)
+        return digest, path
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp): os.unlink(self._tmp)
+
+class BlobStore:
+    """Local content-addressed file store: <root>/ab/cd/<sha256>."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def put_bytes(self, data: bytes) -> Tuple[str, str, int]:
+        """Blocking; call from a worker thread."""
+        w = self.writer()
+        try:
+            w.write(data)
+            digest, path = w.commit()
+        except Exception:
+            w.abort()
+            raise
+        return digest, path, w.size
+
+    def stale(self, older_than: float) -> Iterator[str]:
+        """Blocking. Digests of blobs not written or deduped against in the last `older_than` seconds."""
+        cutoff = time.time() - older_than
+        for root, dirs, names in os.walk(self.root):
+            if root == self.root and "tmp" in dirs: dirs.remove("tmp")
+            for name in names:
+                try:
+                    if os.stat(os.path.join(root, name)).st_mtime < cutoff: yield name
+                except FileNotFoundError:
+                    pass
+
+    def reclaim(self, digest: str, older_than: float) -> bool:
+        """Blocking. Delete a blob the caller found unreferenced, unless a writer deduped against it within
+        `older_than` seconds. The blob is moved aside first, so a writer arriving after that gets
+        FileNotFoundError from utime and stores its own copy; one that touched it before is seen here."""
+        path = self.path_for(digest)
+        grave = os.path.join(self.tmp_dir, f"gc-{digest}")
+        try: os.rename(path, grave)
+        except FileNotFoundError: return False
+        if os.stat(grave).st_mtime >= time.time() - older_than:
+            os.replace(grave, path)  # a new reference is on its way; same bytes even if a writer re-created it
+            return False
+        os.unlink(grave)
+        return True
+
+    def _put_base64(self, data: str, offset: int) -> Tuple[str, str, int]:
+        w = self.writer()
+        try:
+            for chunk in iter_base64(data, offset):
+                w.write(chunk)
+            digest, path = w.commit()
+        except Exception:
+            w.abort()
+            raise
+        return digest, path, w.size
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], max_bytes: int) -> Tuple[str, str, int]:
+        """Write an async byte stream without buffering it. Returns (sha256, path, size)."""
+        w = self.writer()
+        try:
+            async for chunk in chunks:
+                if w.size + len(chunk) > max_bytes:
+                    raise PayloadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                w.write(chunk)
+            digest, path = await asyncio.to_thread(w.commit)
+        except BaseException:
+            w.abort()
+            raise
+        return digest, path, w.size
+
+    async def put_base64(self, data: str, max_bytes: Optional[int] = None) -> Tuple[str, str, int, Optional[str]]:
+        """Decode once into the store. Returns (sha256, path, size, mime_type)."""
+        mime, offset = split_data_url(data)
+        if max_bytes is not None and base64_size(data, offset) > max_bytes:
+            raise PayloadTooLarge(f"Capture exceeds {max_bytes} bytes")
+        digest, path, size = await asyncio.to_thread(self._put_base64, data, offset)
+        return digest, path, size, mime
+
+capture_store = BlobStore(settings.CAPTURE_STORAGE_DIR)
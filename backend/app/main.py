@@ -1,31 +1,88 @@
+import asyncio
 import logging
-import json
+import time
 import os
-import random
 import uuid
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from jose import jwt
-from passlib.context import CryptContext
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Query
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import RedirectResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from starlette.formparsers import MultiPartParser, MultiPartException
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.websocket.connection_manager import manager
+from app.auth.hashing import hash_pool
+from app.auth import tokens
+from app.auth.otp import create_otp_store
+from app.rooms import queue, dispatch, decisions
+from app.signaling.queue_feed import QueueFeed
+from app.signaling import codec
+from app.signaling.ice import IceCoalescer, ICE_TYPES
+from app.signaling.stats import call_stats
+from app.signaling.journal import create_journal
 from app.core.config import settings
-from app.core import models, schemas
-from app.core.database import engine, get_db
-
-# Initialize Database
-models.Base.metadata.create_all(bind=engine)
+from app.core import models, schemas, metrics
+from app.core.database import engine, get_async_db, AsyncSessionLocal, pool_stats
+from app.core.storage import capture_store, split_data_url, iter_base64, capped, PayloadTooLarge
+from app.core.imaging import capture_processor, MIME_TYPES
+from app.core import evidence
+from app.core import export
+from app.core.assets import StaticAssets
+from app.core.ratelimit import RateLimiter, AdmissionGate, client_ip, snapshot as rate_limit_snapshot
+from app.core.pagination import after_id
+from app.core.migrations import prepare as prepare_schema
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Initialize Database: create missing tables, then add new columns/indexes to old ones (one worker at a time)
+prepare_schema(engine, models.Base.metadata, settings.SCHEMA_LOCK_FILE)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+otp_store = create_otp_store(settings.OTP_STORE, timedelta(minutes=10), settings.OTP_MAX_ENTRIES)
+queue_feed = QueueFeed(manager, window=settings.QUEUE_FEED_WINDOW_MS / 1000)
+dispatcher = dispatch.Dispatcher(manager, [p.strip() for p in settings.DISPATCH_PRIORITY.split(",") if p.strip()],
+                                 on_claim=lambda s: queue_feed.publish(s.room_id, status="active"))
+manager.presence_listeners.append(lambda event, room_id, role: dispatcher.poke() if event == "joined" and role == "customer" else None)
+# A call starts when the agent joins and ends when either side leaves
+manager.presence_listeners.append(lambda event, room_id, role: call_stats.begin(room_id) if event == "joined" and role == "agent"
+                                  else call_stats.finish(room_id) if event == "left" else None)
+journal = create_journal(settings.JOURNAL, settings.JOURNAL_DIR, settings.JOURNAL_SEGMENT_BYTES, settings.JOURNAL_QUEUE, settings.JOURNAL_BATCH,
+                         settings.JOURNAL_FLUSH_MS, settings.JOURNAL_RETENTION_DAYS, settings.JOURNAL_MAX_BYTES)
+manager.presence_listeners.append(lambda event, room_id, role: journal.record(event, room_id, role))
+
+async def relay_ice(room_id: str, target_role: str, frame: str, folded: int):
+    call_stats.frame_out(room_id, folded)
+    await manager.send_personal_message(frame, room_id, target_role)
+
+ice_coalescer = IceCoalescer(relay_ice, settings.ICE_BATCH_WINDOW_MS / 1000)
+
+# Rate limiting / admission control (per worker)
+otp_limiter = RateLimiter("otp_send", settings.RATE_LIMIT_OTP_PER_MIN, max_keys=settings.RATE_LIMIT_MAX_KEYS)
+otp_verify_limiter = RateLimiter("otp_verify", settings.RATE_LIMIT_OTP_VERIFY_PER_MIN, max_keys=settings.RATE_LIMIT_MAX_KEYS)
+login_limiter = RateLimiter("login", settings.RATE_LIMIT_LOGIN_PER_MIN, max_keys=settings.RATE_LIMIT_MAX_KEYS)
+ip_limiter = RateLimiter("ip", settings.RATE_LIMIT_IP_PER_MIN, max_keys=settings.RATE_LIMIT_MAX_KEYS)
+ws_join_limiter = RateLimiter("ws_join", settings.RATE_LIMIT_WS_PER_MIN, max_keys=settings.RATE_LIMIT_MAX_KEYS)
+login_gate = AdmissionGate("login", settings.LOGIN_MAX_CONCURRENT)
+
+def ip_limited(request: Request):
+    ip_limiter.check(client_ip(request, settings.TRUST_FORWARDED_FOR))
+
+def peers_by_role() -> Dict[tuple, int]:
+    counts: Dict[tuple, int] = {}
+    for roles in list(manager.rooms.values()):
+        for role in roles: counts[(role,)] = counts.get((role,), 0) + 1
+    return counts
+
+metrics.registry.gauge("kyc_rooms_active", "Rooms with at least one socket on this worker.", lambda: {(): len(manager.rooms)})
+metrics.registry.gauge("kyc_ws_peers", "Room sockets held by this worker, by role.", peers_by_role, ("role",))
+metrics.registry.gauge("kyc_bcrypt_pool_jobs", "bcrypt jobs waiting for or holding a worker.", lambda: {("queued",): hash_pool.queued, ("in_flight",): hash_pool.in_flight}, ("state",))
+metrics.registry.gauge("kyc_db_connections_checked_out", "Pooled DB connections currently in use.", lambda: {(): pool_stats.checked_out})
+metrics.registry.gauge("kyc_capture_transcode_queued", "Captures waiting for the background transcoder.", lambda: {(): capture_processor.queue.qsize()})
 
 tags_metadata = [
     {"name": "1. Authentication & Security", "description": "Registration, Set MPIN, and Secure Login."},
@@ -41,6 +98,7 @@ import traceback
 
 app = FastAPI(title="Video KYC Fintech Ultimate Pro", version="11.0.0", openapi_tags=tags_metadata)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(metrics.MetricsMiddleware)
 
 # --- DEBUGGERS ---
 @app.exception_handler(RequestValidationError)
@@ -51,46 +109,102 @@ async def validation_exception_handler(request, exc):
 async def global_exception_handler(request, exc):
     return JSONResponse(status_code=500, content={"detail": "Internal Server Error", "reason": str(exc)})
 
+# --- LIFECYCLE ---
+@app.on_event("startup")
+async def start_registry():
+    await manager.start()
+    await journal.start()
+    app.state.blacklist_purger = asyncio.create_task(tokens.purge_blacklist_forever(settings.BLACKLIST_PURGE_INTERVAL))
+    app.state.removal_purger = asyncio.create_task(queue.purge_removals_forever(600))
+    app.state.dispatcher = asyncio.create_task(dispatcher.run()) if settings.DISPATCH_ENABLED else None
+    await capture_processor.start()
+    app.state.blob_gc = asyncio.create_task(capture_processor.gc_forever(settings.CAPTURE_GC_INTERVAL, settings.CAPTURE_GC_GRACE))
+    app.state.otp_purger = asyncio.create_task(otp_store.purge_forever(300))
+    app.state.heartbeat = asyncio.create_task(manager.heartbeat_forever(settings.WS_HEARTBEAT_INTERVAL, settings.WS_IDLE_TIMEOUT, peer_left))
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    hash_pool.shutdown()
+    app.state.blacklist_purger.cancel()
+    app.state.removal_purger.cancel()
+    if app.state.dispatcher: app.state.dispatcher.cancel()
+    await capture_processor.stop()
+    app.state.blob_gc.cancel()
+    app.state.otp_purger.cancel()
+    app.state.heartbeat.cancel()
+    await manager.stop()
+    await journal.stop()
+
 # --- HELPERS ---
 def create_token(sub: str, role: str):
-    return jwt.encode({"sub": sub, "role": role, "exp": datetime.utcnow() + timedelta(days=1)}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    return jwt.encode({"sub": sub, "role": role, "exp": datetime.utcnow() + tokens.ACCESS_TOKEN_TTL}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
 
-def get_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    # 1. Check if token is blacklisted
-    blacklisted = db.query(models.TokenBlacklist).filter(models.TokenBlacklist.token == token).first()
-    if blacklisted:
+async def get_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    try: payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except: raise HTTPException(401)
+
+    # 1. Check if token is blacklisted (cached until the token's exp)
+    if await tokens.is_revoked(db, token, payload["exp"]):
         raise HTTPException(status_code=401, detail="Token has been logged out")
 
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        user = db.query(models.User).filter((models.User.username == payload["sub"]) | (models.User.mobile_number == payload["sub"])).first()
-        if not user: raise HTTPException(401)
-        return user
-    except: raise HTTPException(401)
+    # 2. Resolve the user (short-lived principal cache)
+    user = await tokens.load_principal(db, payload["sub"])
+    if not user: raise HTTPException(401)
+    return user
+
+async def capture_session(db: AsyncSession, room_id: str) -> models.KYCSession:
+    s = await db.scalar(select(models.KYCSession).filter(models.KYCSession.room_id == room_id))
+    if not s:
+        s = models.KYCSession(room_id=room_id, status="active")
+        db.add(s); await db.commit(); await db.refresh(s)
+    return s
+
+def announce_requested(s: models.KYCSession):
+    queue_feed.publish(s.room_id, service_type=s.service_type, status="requested", is_customer_online=False, requested_at=s.requested_at)
+    dispatcher.poke()
+
+async def peer_left(room_id: str, role: str):
+    """Room cleanup once a socket is gone, whether the client closed it or the heartbeat reaped it."""
+    if role == "customer":
+        ice_coalescer.drop_room(room_id)
+        # Auto-purge DB session if customer leaves
+        async with AsyncSessionLocal() as db:
+            s = await db.scalar(select(models.KYCSession).filter(models.KYCSession.room_id == room_id))
+            if s and s.status != "completed":
+                await db.delete(s); queue.record_removals(db, [room_id]); await db.commit()
+                queue_feed.publish(room_id, removed=True)
+                await journal.write("purged", room_id, role)
+    journal.record("close-session", room_id, role)
+    other = "agent" if role == "customer" else "customer"
+    if role == "agent": await ice_coalescer.flush(room_id, other)  # the agent's last candidates go out before close-session
+    await manager.send_personal_message({"type": "close-session"}, room_id, other)
 
 # ----------------- 1. AUTHENTICATION & SECURITY -----------------
 
 
 @app.post("/api/auth/agent/register", tags=["1. Authentication & Security"])
-async def register_agent(user: schemas.AgentRegister, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter((models.User.username == user.username) | (models.User.mobile_number == user.mobile_number) | (models.User.aadhar_number == user.aadhar_number) | (models.User.pan_number == user.pan_number)).first()
+async def register_agent(user: schemas.AgentRegister, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.scalar(select(models.User).filter((models.User.username == user.username) | (models.User.mobile_number == user.mobile_number) | (models.User.aadhar_number == user.aadhar_number) | (models.User.pan_number == user.pan_number)))
     if existing: raise HTTPException(status_code=400, detail="Data already exists")
-    hashed = pwd_context.hash(user.password[:50])
+    hashed = await hash_pool.hash(user.password[:50])
     new_user = models.User(username=user.username, mobile_number=user.mobile_number, aadhar_number=user.aadhar_number, pan_number=user.pan_number, role="agent", hashed_password=hashed)
-    db.add(new_user); db.commit(); db.refresh(new_user)
+    db.add(new_user); await db.commit(); await db.refresh(new_user)
     return {"access_token": create_token(user.username, "agent"), "token_type": "bearer", "user_id": new_user.id}
 
 @app.post("/api/auth/set-mpin", tags=["1. Authentication & Security"])
-async def set_mpin(req: schemas.SetMPIN, current_user: models.User = Depends(get_user), db: Session = Depends(get_db)):
-    current_user.hashed_mpin = pwd_context.hash(req.mpin); current_user.is_mpin_set = True; db.commit()
+async def set_mpin(req: schemas.SetMPIN, current_user: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    current_user.hashed_mpin = await hash_pool.hash(req.mpin); current_user.is_mpin_set = True; await db.commit()
+    tokens.invalidate_principal(current_user)
     return {"message": "MPIN set successfully"}
 
-@app.post("/api/auth/login", response_model=schemas.Token, tags=["1. Authentication & Security"])
-async def login(req: schemas.UserLogin, db: Session = Depends(get_db)):
+@app.post("/api/auth/login", response_model=schemas.Token, tags=["1. Authentication & Security"], dependencies=[Depends(ip_limited)])
+async def login(req: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Secure Login: Role is automatically detected from the database."""
-    user = db.query(models.User).filter((models.User.username == req.identifier) | (models.User.mobile_number == req.identifier)).first()
-    
-    if not user or not user.is_mpin_set or not pwd_context.verify(req.mpin, user.hashed_mpin):
+    login_limiter.check(req.identifier)
+    with login_gate:  # sheds with 429 instead of piling up behind bcrypt
+        user = await db.scalar(select(models.User).filter((models.User.username == req.identifier) | (models.User.mobile_number == req.identifier)))
+        valid = user and user.is_mpin_set and await hash_pool.verify(req.mpin, user.hashed_mpin)
+    if not valid:
         raise HTTPException(401, "Invalid Credentials or MPIN")
     
     # Check for Agent specific gate
@@ -104,145 +218,327 @@ async def login(req: schemas.UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/auth/logout", tags=["1. Authentication & Security"])
-async def logout(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def logout(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """Add current token to blacklist to prevent further use."""
     # Check if already blacklisted
-    exists = db.query(models.TokenBlacklist).filter(models.TokenBlacklist.token == token).first()
+    try: exp = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])["exp"]
+    except: exp = None
+    exists = await db.scalar(select(models.TokenBlacklist).filter(models.TokenBlacklist.token == token))
     if not exists:
-        db.add(models.TokenBlacklist(token=token))
-        db.commit()
+        db.add(models.TokenBlacklist(token=token, expires_at=datetime.utcfromtimestamp(exp) if exp else None))
+        await db.commit()
+    tokens.revoke(token, exp)
     return {"message": "Logged out successfully"}
 
 # ----------------- 2. IDENTITY VERIFICATION (KYC) -----------------
 
-@app.post("/api/verify/mobile/request", tags=["2. Identity Verification (KYC)"])
-async def request_mobile_otp(req: schemas.MobileRequest, db: Session = Depends(get_db)):
-    otp = str(random.randint(100000, 999999))
-    db.add(models.OTPTracker(identifier=req.mobile_number, otp_code=otp, expires_at=datetime.utcnow() + timedelta(minutes=10)))
-    db.commit(); logger.info(f"OTP: {otp}")
+@app.post("/api/verify/mobile/request", tags=["2. Identity Verification (KYC)"], dependencies=[Depends(ip_limited)])
+async def request_mobile_otp(req: schemas.MobileRequest, db: AsyncSession = Depends(get_async_db)):
+    otp_limiter.check(req.mobile_number)
+    otp = await otp_store.issue(db, req.mobile_number)
+    logger.info(f"OTP: {otp}")
     return {"message": "OTP Sent"}
 
-@app.post("/api/verify/mobile/resend", tags=["2. Identity Verification (KYC)"])
-async def resend_mobile_otp(req: schemas.MobileRequest, db: Session = Depends(get_db)):
+@app.post("/api/verify/mobile/resend", tags=["2. Identity Verification (KYC)"], dependencies=[Depends(ip_limited)])
+async def resend_mobile_otp(req: schemas.MobileRequest, db: AsyncSession = Depends(get_async_db)):
     return await request_mobile_otp(req, db)
 
-@app.post("/api/verify/mobile/verify", tags=["2. Identity Verification (KYC)"])
-async def verify_mobile_otp(req: schemas.MobileVerify, db: Session = Depends(get_db)):
-    tracker = db.query(models.OTPTracker).filter(models.OTPTracker.identifier == req.mobile_number, models.OTPTracker.otp_code == req.otp, models.OTPTracker.expires_at > datetime.utcnow()).first()
-    if not tracker: raise HTTPException(400, "Invalid OTP")
-    dup = db.query(models.User).filter(models.User.mobile_number == req.mobile_number, models.User.is_mobile_verified == True).first()
+@app.post("/api/verify/mobile/verify", tags=["2. Identity Verification (KYC)"], dependencies=[Depends(ip_limited)])
+async def verify_mobile_otp(req: schemas.MobileVerify, db: AsyncSession = Depends(get_async_db)):
+    otp_verify_limiter.check(req.mobile_number)
+    if not await otp_store.verify(db, req.mobile_number, req.otp): raise HTTPException(400, "Invalid OTP")
+    dup = await db.scalar(select(models.User).filter(models.User.mobile_number == req.mobile_number, models.User.is_mobile_verified == True))
     if dup: raise HTTPException(400, detail="Mobile number already linked to another account")
-    user = db.query(models.User).filter(models.User.mobile_number == req.mobile_number).first()
+    user = await db.scalar(select(models.User).filter(models.User.mobile_number == req.mobile_number))
     if not user:
         user = models.User(mobile_number=req.mobile_number, is_mobile_verified=True, role="customer")
         db.add(user)
     else: user.is_mobile_verified = True
-    db.commit(); db.refresh(user)
+    await db.commit(); await db.refresh(user)
+    await otp_store.discard(db, req.mobile_number)
+    tokens.invalidate_principal(user)
     return {"access_token": create_token(req.mobile_number, user.role), "token_type": "bearer"}
 
 @app.post("/api/verify/aadhar/request", tags=["2. Identity Verification (KYC)"])
-async def request_aadhar_otp(req: schemas.AadharRequest, current_user: models.User = Depends(get_user), db: Session = Depends(get_db)):
-    otp = str(random.randint(100000, 999999))
-    db.add(models.OTPTracker(identifier=req.aadhar_number, otp_code=otp, expires_at=datetime.utcnow() + timedelta(minutes=10)))
-    db.commit(); logger.info(f"OTP: {otp}")
+async def request_aadhar_otp(req: schemas.AadharRequest, current_user: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    otp_limiter.check(req.aadhar_number)
+    otp = await otp_store.issue(db, req.aadhar_number)
+    logger.info(f"OTP: {otp}")
     return {"message": "Aadhar OTP Sent"}
 
 @app.post("/api/verify/aadhar/verify", tags=["2. Identity Verification (KYC)"])
-async def verify_aadhar_otp(req: schemas.AadharVerify, current_user: models.User = Depends(get_user), db: Session = Depends(get_db)):
-    dup = db.query(models.User).filter(models.User.aadhar_number == req.aadhar_number, models.User.id != current_user.id).first()
+async def verify_aadhar_otp(req: schemas.AadharVerify, current_user: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    otp_verify_limiter.check(req.aadhar_number)
+    dup = await db.scalar(select(models.User).filter(models.User.aadhar_number == req.aadhar_number, models.User.id != current_user.id))
     if dup: raise HTTPException(400, detail="Aadhar number already linked to another account")
-    tracker = db.query(models.OTPTracker).filter(models.OTPTracker.identifier == req.aadhar_number, models.OTPTracker.otp_code == req.otp, models.OTPTracker.expires_at > datetime.utcnow()).first()
-    if not tracker: raise HTTPException(400, "Invalid OTP")
+    if not await otp_store.verify(db, req.aadhar_number, req.otp): raise HTTPException(400, "Invalid OTP")
     current_user.aadhar_number, current_user.is_aadhar_verified = req.aadhar_number, True
-    db.commit()
+    await db.commit(); tokens.invalidate_principal(current_user)
+    await otp_store.discard(db, req.aadhar_number)
     return {"message": "Aadhar Verified"}
 
 @app.post("/api/verify/pan/verify", tags=["2. Identity Verification (KYC)"])
-async def verify_pan(req: schemas.PANVerify, current_user: models.User = Depends(get_user), db: Session = Depends(get_db)):
-    dup = db.query(models.User).filter(models.User.pan_number == req.pan_number, models.User.id != current_user.id).first()
+async def verify_pan(req: schemas.PANVerify, current_user: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    dup = await db.scalar(select(models.User).filter(models.User.pan_number == req.pan_number, models.User.id != current_user.id))
     if dup: raise HTTPException(400, detail="PAN number already linked to another account")
     current_user.pan_number, current_user.is_pan_verified = req.pan_number, True
-    db.commit()
+    await db.commit(); tokens.invalidate_principal(current_user)
     return {"message": "PAN Verified"}
 
 # ----------------- 3. FINTECH SERVICES -----------------
 
 @app.post("/api/services/apply/account", tags=["3. Fintech Services"])
-async def apply_account(req: schemas.AccountApply, u: models.User = Depends(get_user), db: Session = Depends(get_db)):
+async def apply_account(req: schemas.AccountApply, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
     room_id = f"acc-{uuid.uuid4().hex[:6]}"
-    db.add(models.KYCSession(room_id=room_id, customer_id=u.id, service_type="ACCOUNT_OPENING"))
-    db.commit(); return {"room_id": room_id}
+    s = models.KYCSession(room_id=room_id, customer_id=u.id, service_type="ACCOUNT_OPENING"); db.add(s)
+    await db.commit(); announce_requested(s); return {"room_id": room_id}
 
 @app.post("/api/services/apply/card", tags=["3. Fintech Services"])
-async def apply_card(req: schemas.CardApply, u: models.User = Depends(get_user), db: Session = Depends(get_db)):
+async def apply_card(req: schemas.CardApply, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
     room_id = f"card-{uuid.uuid4().hex[:6]}"
-    db.add(models.KYCSession(room_id=room_id, customer_id=u.id, service_type="CARD_ISSUANCE"))
-    db.commit(); return {"room_id": room_id}
+    s = models.KYCSession(room_id=room_id, customer_id=u.id, service_type="CARD_ISSUANCE"); db.add(s)
+    await db.commit(); announce_requested(s); return {"room_id": room_id}
 
 @app.post("/api/services/apply/loan", tags=["3. Fintech Services"])
-async def apply_loan(req: schemas.LoanApply, u: models.User = Depends(get_user), db: Session = Depends(get_db)):
+async def apply_loan(req: schemas.LoanApply, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
     room_id = f"loan-{uuid.uuid4().hex[:6]}"
-    db.add(models.KYCSession(room_id=room_id, customer_id=u.id, service_type="LOAN_APPROVAL"))
+    s = models.KYCSession(room_id=room_id, customer_id=u.id, service_type="LOAN_APPROVAL"); db.add(s)
     db.add(models.LoanApplication(customer_id=u.id, amount=req.amount, purpose=req.purpose))
-    db.commit(); return {"room_id": room_id}
+    await db.commit(); announce_requested(s); return {"room_id": room_id}
 
 @app.post("/api/services/card/block", tags=["3. Fintech Services"])
-async def block_card(req: schemas.CardBlock, u: models.User = Depends(get_user), db: Session = Depends(get_db)):
+async def block_card(req: schemas.CardBlock, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
     room_id = f"block-{uuid.uuid4().hex[:6]}"
-    db.add(models.KYCSession(room_id=room_id, customer_id=u.id, service_type="CARD_BLOCKING"))
-    db.commit(); return {"room_id": room_id}
+    s = models.KYCSession(room_id=room_id, customer_id=u.id, service_type="CARD_BLOCKING"); db.add(s)
+    await db.commit(); announce_requested(s); return {"room_id": room_id}
 
 # ----------------- 4. VIDEO KYC ORCHESTRATION -----------------
 
-@app.get("/api/kyc/pending", tags=["4. Video KYC Orchestration"])
-async def list_pending(db: Session = Depends(get_db)):
-    """List requested sessions. Shows if customer is online or not."""
-    all_req = db.query(models.KYCSession).filter(models.KYCSession.status == "requested").all()
-    results = []
-    for s in all_req:
-        is_online = s.room_id in manager.rooms and "customer" in manager.rooms[s.room_id]
-        results.append({
-            "room_id": s.room_id,
-            "service_type": s.service_type,
-            "status": s.status,
-            "is_customer_online": is_online
-        })
-    return results
+async def pending_view(sessions) -> List[dict]:
+    online = await manager.online_rooms([s.room_id for s in sessions], "customer")
+    return [{
+        "room_id": s.room_id,
+        "service_type": s.service_type,
+        "status": s.status,
+        "is_customer_online": s.room_id in online,
+        "requested_at": s.requested_at,
+    } for s in sessions]
+
+@app.get("/api/kyc/pending", response_model=List[schemas.PendingSession], tags=["4. Video KYC Orchestration"])
+async def list_pending(response: Response, limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None, service_type: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    """List requested sessions, oldest first. Shows if customer is online or not.
+    Next page cursor is returned in `X-Next-Cursor`; `X-Changes-Cursor` seeds `/api/kyc/pending/changes`."""
+    changes_from = datetime.utcnow()
+    page, next_cursor = await queue.pending_page(db, limit, cursor, service_type)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Changes-Cursor"] = queue.changes_cursor(changes_from)
+    return await pending_view(page)
+
+@app.get("/api/kyc/pending/changes", response_model=schemas.PendingChanges, tags=["4. Video KYC Orchestration"])
+async def pending_changes(since: str, service_type: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    """Incremental queue poll: sessions changed or removed since the cursor (410 if the cursor is too old)."""
+    changed, removed, cursor = await queue.pending_changes(db, since, service_type)
+    return {"changed": await pending_view(changed), "removed": removed, "cursor": cursor}
 
 @app.delete("/api/kyc/clear-all", tags=["4. Video KYC Orchestration"])
-async def clear_all_pending(current_user: models.User = Depends(get_user), db: Session = Depends(get_db)):
+async def clear_all_pending(current_user: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
     if current_user.role != "agent": raise HTTPException(403)
-    db.query(models.KYCSession).filter(models.KYCSession.status == "requested").delete()
-    db.commit()
+    room_ids = (await db.scalars(select(models.KYCSession.room_id).filter(models.KYCSession.status == "requested"))).all()
+    await db.execute(delete(models.KYCSession).filter(models.KYCSession.status == "requested", models.KYCSession.room_id.in_(room_ids)))
+    queue.record_removals(db, room_ids)
+    await db.commit()
+    for r in room_ids: queue_feed.publish(r, removed=True)
     return {"message": "Success"}
 
 @app.post("/api/kyc/accept/{room_id}", tags=["4. Video KYC Orchestration"])
-async def accept_kyc(room_id: str, u: models.User = Depends(get_user), db: Session = Depends(get_db)):
-    s = db.query(models.KYCSession).filter(models.KYCSession.room_id == room_id).first()
-    if not s: raise HTTPException(404)
-    s.agent_id, s.status = u.id, "active"
-    db.commit(); return {"message": "Accepted"}
+async def accept_kyc(room_id: str, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    # Atomic claim: only one agent can move a session out of "requested"
+    if not await dispatch.claim(db, room_id, u.id):
+        exists = await db.scalar(select(models.KYCSession.id).filter(models.KYCSession.room_id == room_id))
+        if not exists: raise HTTPException(404)
+        raise HTTPException(409, detail="Session already claimed")
+    queue_feed.publish(room_id, status="active")
+    return {"message": "Accepted"}
+
+@app.post("/api/kyc/dispatch/next", tags=["4. Video KYC Orchestration"])
+async def dispatch_next(request: Request, response: Response, wait: float = Query(25, ge=0, le=60), u: models.User = Depends(get_user)):
+    """Agent: Long-poll for the next assigned customer (FIFO among idle agents, oldest online customer by service priority). 204 on timeout."""
+    if u.role != "agent": raise HTTPException(403)
+    if not settings.DISPATCH_ENABLED: raise HTTPException(404, detail="Dispatcher disabled")
+    s = await dispatcher.next_for(u.id, wait, request.is_disconnected)
+    if not s: response.status_code = 204; return None
+    if await request.is_disconnected():
+        # Claimed in the moment the agent went away: hand the customer back to the queue
+        async with AsyncSessionLocal() as db: await dispatch.release(db, s.room_id, u.id)
+        queue_feed.publish(s.room_id, status="requested"); dispatcher.poke()
+        return None
+    return {"room_id": s.room_id, "service_type": s.service_type, "queue_wait_seconds": (s.accepted_at - s.requested_at).total_seconds()}
+
+@app.get("/api/signaling/stats", tags=["4. Video KYC Orchestration"])
+async def signaling_stats():
+    """Per-room signaling message counters and time-to-connect for recent calls, plus heartbeat reaps (this worker)."""
+    return {**call_stats.snapshot(), "reaped": manager.reaped}
+
+@app.get("/api/kyc/dispatch/stats", tags=["4. Video KYC Orchestration"])
+async def dispatch_stats():
+    """Queue wait times (requested -> claimed) per service type, plus claim conflicts."""
+    return {**dispatch.wait_stats.snapshot(), "idle_agents": len(dispatcher.waiting), "enabled": settings.DISPATCH_ENABLED}
 
 @app.post("/api/session/capture", tags=["4. Video KYC Orchestration"])
-async def log_capture(capture: schemas.CaptureLog, db: Session = Depends(get_db)):
-    s = db.query(models.KYCSession).filter(models.KYCSession.room_id == capture.room_id).first()
-    if not s:
-        s = models.KYCSession(room_id=capture.room_id, status="active")
-        db.add(s); db.commit(); db.refresh(s)
-    db.add(models.Capture(session_id=s.id, label=capture.label, image_base64=capture.image_data))
-    db.commit(); return {"status": "Saved"}
+async def log_capture(capture: schemas.CaptureLog, db: AsyncSession = Depends(get_async_db)):
+    try: digest, path, size, mime = await capture_store.put_base64(capture.image_data, settings.CAPTURE_MAX_BYTES)
+    except PayloadTooLarge as e: raise HTTPException(413, detail=str(e))
+    s = await capture_session(db, capture.room_id)
+    c = models.Capture(session_id=s.id, label=capture.label, content_hash=digest, storage_path=path, size_bytes=size, mime_type=mime or "image/png")
+    db.add(c); await db.commit()
+    capture_processor.submit(c.id)
+    metrics.captures.inc(("base64",)); metrics.capture_bytes.inc(("base64",), size)
+    return {"status": "Saved", "capture_id": c.id}
+
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries, part headers and small fields on top of the file itself
+
+@app.post("/api/session/capture/upload", tags=["4. Video KYC Orchestration"])
+async def upload_capture(request: Request, room_id: str = Query(...), label: str = Query(...), u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    """Agent: Upload a capture as raw bytes (image/* or application/octet-stream body) or multipart field `file`. Streamed to storage."""
+    if u.role != "agent": raise HTTPException(403)
+    content_type = request.headers.get("content-type", "")
+    multipart = content_type.startswith("multipart/form-data")
+    # The file itself is capped at CAPTURE_MAX_BYTES by put_stream; a multipart body may carry the envelope on top
+    max_body = settings.CAPTURE_MAX_BYTES + (MULTIPART_OVERHEAD if multipart else 0)
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_body:
+        raise HTTPException(413, detail=f"Capture larger than {settings.CAPTURE_MAX_BYTES} bytes")
+
+    form = None
+    if multipart:
+        # Parse from a capped stream: a chunked body (no Content-Length) is cut off at the limit instead of being spooled whole
+        stream = capped(request.stream(), max_body)
+        try: form = await MultiPartParser(request.headers, stream, max_files=1, max_fields=10).parse()
+        except PayloadTooLarge: raise HTTPException(413, detail=f"Capture larger than {settings.CAPTURE_MAX_BYTES} bytes")
+        except MultiPartException as e: raise HTTPException(400, detail=e.message)
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str): await form.close(); raise HTTPException(400, "Missing multipart field 'file'")
+        mime = upload.content_type
+        async def chunks():
+            while chunk := await upload.read(64 * 1024): yield chunk
+        body = chunks()
+    else:
+        mime = content_type.split(";")[0].strip()
+        body = request.stream()
+    if not mime.startswith("image/"): mime = "image/png"
+
+    started = time.perf_counter()
+    try:
+        digest, path, size = await capture_store.put_stream(body, settings.CAPTURE_MAX_BYTES)
+    except PayloadTooLarge as e:
+        raise HTTPException(413, detail=str(e))
+    finally:
+        if form is not None: await form.close()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    s = await capture_session(db, room_id)
+    c = models.Capture(session_id=s.id, label=label, content_hash=digest, storage_path=path, size_bytes=size, mime_type=mime)
+    db.add(c); await db.commit()
+    capture_processor.submit(c.id)
+    metrics.captures.inc(("upload",)); metrics.capture_bytes.inc(("upload",), size)
+    mbps = size / elapsed / (1024 * 1024)
+    logger.info(f"Capture ingested: room={room_id} label={label} bytes={size} in {elapsed * 1000:.1f}ms ({mbps:.1f} MiB/s)")
+    return {"status": "Saved", "capture_id": c.id, "bytes": size, "ingest_ms": round(elapsed * 1000, 2), "throughput_mib_s": round(mbps, 2)}
+
+@app.get("/api/session/capture/{capture_id}/image", tags=["4. Video KYC Orchestration"])
+async def download_capture(capture_id: int, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    """Agent: Stream a captured image straight from the blob store."""
+    if u.role != "agent": raise HTTPException(403)
+    c = await db.get(models.Capture, capture_id)
+    if not c: raise HTTPException(404)
+    if c.storage_path:
+        # FileResponse streams from disk (sendfile/pathsend where the server supports it)
+        return FileResponse(c.storage_path, media_type=c.mime_type, headers={"Cache-Control": "private, max-age=31536000, immutable"})
+    # Legacy row still holding base64 in the database
+    mime, offset = split_data_url(c.image_base64 or "")
+    return StreamingResponse(iter_base64(c.image_base64 or "", offset), media_type=mime or "image/png")
+
+RELAY_TYPES = frozenset(["offer", "answer", "media-status", "close-session"])
+# Client-chosen "type" values are bucketed so a bad client can't blow up metric cardinality
+METRIC_TYPES = RELAY_TYPES | ICE_TYPES | {"chat", "ice-connected", "pong"}
+
+@app.get("/api/session/capture/{capture_id}/thumbnail", tags=["4. Video KYC Orchestration"])
+async def capture_thumbnail(capture_id: int, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    """Agent: Small gallery preview; falls back to the full image until processing has run."""
+    if u.role != "agent": raise HTTPException(403)
+    c = await db.get(models.Capture, capture_id)
+    if not c: raise HTTPException(404)
+    if not c.thumb_path: return await download_capture(capture_id, u, db)
+    # Thumbnails are always re-encoded, even when the full image kept its original format
+    return FileResponse(c.thumb_path, media_type=c.thumb_mime_type or MIME_TYPES.get(settings.CAPTURE_FORMAT, "image/webp"), headers={"Cache-Control": "private, max-age=31536000, immutable"})
+
+@app.get("/api/session/{room_id}/captures", tags=["4. Video KYC Orchestration"])
+async def list_captures(room_id: str, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    """Agent: Capture gallery for a session (metadata only; images load from the thumbnail/image URLs)."""
+    if u.role != "agent": raise HTTPException(403)
+    rows = (await db.execute(
+        select(models.Capture.id, models.Capture.label, models.Capture.size_bytes, models.Capture.mime_type, models.Capture.timestamp, models.Capture.processed_at, models.Capture.process_error)
+        .join(models.KYCSession, models.KYCSession.id == models.Capture.session_id)
+        .filter(models.KYCSession.room_id == room_id).order_by(models.Capture.id)
+    )).all()
+    return [{
+        "id": r.id, "label": r.label, "size_bytes": r.size_bytes, "mime_type": r.mime_type, "timestamp": r.timestamp,
+        "processed": r.processed_at is not None and r.process_error is None,
+        "thumbnail_url": f"/api/session/capture/{r.id}/thumbnail", "image_url": f"/api/session/capture/{r.id}/image",
+    } for r in rows]
+
+def evidence_response(sessions, name: str):
+    return StreamingResponse(evidence.bundle(sessions), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{name}.zip"'})
+
+@app.get("/api/session/{room_id}/evidence", tags=["4. Video KYC Orchestration"])
+async def session_evidence(room_id: str, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    """Agent/compliance: Streamed ZIP of a session's captures plus manifest.json (session, customer/agent, decision, timestamps)."""
+    if u.role != "agent": raise HTTPException(403)
+    if not await db.scalar(select(models.KYCSession.id).filter(models.KYCSession.room_id == room_id)): raise HTTPException(404)
+    return evidence_response(select(models.KYCSession).filter(models.KYCSession.room_id == room_id), f"evidence-{evidence.safe_name(room_id)}")
+
+@app.get("/api/admin/evidence/export", tags=["5. Support & Admin"])
+async def export_evidence(start: datetime = Query(..., alias="from"), end: datetime = Query(..., alias="to"), service_type: Optional[str] = None, status: Optional[str] = None, u: models.User = Depends(get_user)):
+    """Compliance: One streamed ZIP for every session requested in [from, to), one folder per session. Constant memory."""
+    if u.role != "agent": raise HTTPException(403)
+    q = select(models.KYCSession).filter(models.KYCSession.requested_at >= start, models.KYCSession.requested_at < end)
+    if service_type: q = q.filter(models.KYCSession.service_type == service_type)
+    if status: q = q.filter(models.KYCSession.status == status)
+    return evidence_response(q, f"evidence-{start:%Y%m%d}-{end:%Y%m%d}")
+
+@app.get("/api/admin/capture-pipeline", tags=["5. Support & Admin"])
+async def capture_pipeline_stats():
+    """Queue depth and savings of the background capture transcoder."""
+    return capture_processor.stats()
+
+# Registered before /ws/{room_id}/{client_id}, which would otherwise match this path
+@app.websocket("/ws/agent/queue")
+async def ws_queue_feed(websocket: WebSocket, token: str = Query(...)):
+    """Agent: Push feed of pending-queue deltas ({"type": "queue-delta", "changes": [partial rows]})."""
+    try:
+        p = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        async with AsyncSessionLocal() as db:
+            user = await tokens.load_principal(db, p["sub"])
+    except: await websocket.close(code=1008); return
+    if not user or user.role != "agent" or not user.is_admin_approved: await websocket.close(code=1008); return
+    try: await queue_feed.serve(websocket)
+    except WebSocketDisconnect: pass
 
 @app.websocket("/ws/{room_id}/{client_id}")
 async def ws_end(websocket: WebSocket, room_id: str, client_id: str, token: str = Query(...)):
     user_role = "customer" # Default
+    if ws_join_limiter.hit(client_ip(websocket, settings.TRUST_FORWARDED_FOR)):
+        # Accept first: a close before the handshake reaches the client as HTTP 403, not as code 1013
+        await websocket.accept(); await websocket.close(code=1013, reason="Too many joins, retry later"); return
     try:
         p = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        db = next(get_db())
-        user = db.query(models.User).filter((models.User.username == p["sub"]) | (models.User.mobile_number == p["sub"])).first()
+        async with AsyncSessionLocal() as db:
+            user = await tokens.load_principal(db, p["sub"])
+            db_session = await db.scalar(select(models.KYCSession).filter(models.KYCSession.room_id == room_id))
         if not user or not user.is_mpin_set: await websocket.close(code=1008); return
         
         user_role = user.role.lower().strip()
-        db_session = db.query(models.KYCSession).filter(models.KYCSession.room_id == room_id).first()
         if not db_session: await websocket.close(code=4003); return
 
         success = await manager.connect(websocket, room_id, client_id, user_role)
@@ -251,77 +547,155 @@ async def ws_end(websocket: WebSocket, room_id: str, client_id: str, token: str
         t = "customer" if user_role == "agent" else "agent"
         while True:
             data = await websocket.receive_text()
-            m = json.loads(data)
-            if m.get("type") in ["offer", "answer", "ice-candidate", "media-status", "close-session"]:
-                await manager.send_personal_message(m, room_id, t)
-            elif m.get("type") == "chat": await manager.broadcast(room_id, m, exclude_role=user_role)
+            if not manager.touch(websocket): return  # reaped while we waited: its room slot and cleanup are gone already
+            # Chars * 4 bounds the UTF-8 size, so only near-limit frames pay for the encode
+            if len(data) * 4 > settings.WS_MAX_FRAME_BYTES and len(data.encode()) > settings.WS_MAX_FRAME_BYTES:
+                metrics.ws_oversize.inc()
+                logger.warning(f"Dropped {len(data)}-char frame from {user_role} in room {room_id}")
+                continue
+            # Fast path: peek at "type" and forward the original text without re-serializing
+            kind = codec.peek_type(data)
+            call_stats.frame_in(room_id, kind)
+            metrics.ws_messages.inc((kind if kind in METRIC_TYPES else "other",))
+            if kind in ICE_TYPES: await ice_coalescer.push(room_id, t, data)
+            elif kind in RELAY_TYPES:
+                await ice_coalescer.flush(room_id, t)  # keep candidates ahead of the frame that follows them
+                call_stats.frame_out(room_id)
+                if kind == "close-session": journal.record(kind, room_id, user_role)
+                await manager.send_personal_message(data, room_id, t)
+            elif kind == "chat":
+                journal.record(kind, room_id, user_role, data)
+                await manager.broadcast(room_id, data, exclude_role=user_role)
+            elif kind == "ice-connected": call_stats.connected(room_id)
     except WebSocketDisconnect:
-        manager.disconnect(room_id, user_role)
-        if user_role == "customer":
-            # Auto-purge DB session if customer leaves
-            db = next(get_db())
-            s = db.query(models.KYCSession).filter(models.KYCSession.room_id == room_id).first()
-            if s and s.status != "completed": db.delete(s); db.commit()
-        await manager.send_personal_message({"type": "close-session"}, room_id, "agent" if user_role=="customer" else "customer")
-    except: await websocket.close(code=1008)
+        # False if the heartbeat already reaped this socket (and maybe a new one took its place)
+        if manager.disconnect(room_id, user_role, websocket): await peer_left(room_id, user_role)
+    except:
+        if manager.disconnect(room_id, user_role, websocket): await peer_left(room_id, user_role)
+        try: await websocket.close(code=1008)
+        except Exception: pass
 
 # ----------------- 5. SUPPORT & ADMIN -----------------
 
-@app.get("/api/admin/all-users", tags=["5. Support & Admin"])
-async def list_all_users(db: Session = Depends(get_db)):
-    return db.query(models.User).all()
+def projection(model, schema):
+    """SELECT only the columns the response schema exposes."""
+    return select(*[getattr(model, f) for f in schema.model_fields])
+
+def export_response(q, id_col, schema, fmt: str, name: str):
+    return StreamingResponse(export.stream_rows(q, id_col, list(schema.model_fields), fmt), media_type=export.MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'})
+
+@app.get("/api/admin/all-users", response_model=List[schemas.UserOut], tags=["5. Support & Admin"])
+async def list_all_users(response: Response, limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None, role: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    """Admin: Users by id, paginated. Next page cursor in `X-Next-Cursor`."""
+    q = projection(models.User, schemas.UserOut)
+    if role: q = q.filter(models.User.role == role)
+    rows, next_cursor = await export.page(db, q, models.User.id, after_id(cursor), limit)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@app.get("/api/admin/export/users", tags=["5. Support & Admin"])
+async def export_users(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), role: Optional[str] = None):
+    """Admin: Stream every user as NDJSON or CSV in constant memory."""
+    q = projection(models.User, schemas.UserOut)
+    if role: q = q.filter(models.User.role == role)
+    return export_response(q, models.User.id, schemas.UserOut, format, "users")
+
+@app.get("/api/admin/export/tickets", tags=["5. Support & Admin"])
+async def export_tickets(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), status: Optional[str] = None):
+    """Admin: Stream every ticket (optionally by status) as NDJSON or CSV in constant memory."""
+    q = projection(models.Ticket, schemas.TicketOut)
+    if status: q = q.filter(models.Ticket.status == status)
+    return export_response(q, models.Ticket.id, schemas.TicketOut, format, "tickets")
+
+@app.get("/api/admin/journal", tags=["5. Support & Admin"])
+async def journal_stats():
+    """Event journal queue depth, batch sizes and drops (this worker)."""
+    return journal.stats()
+
+@app.get("/api/admin/hash-pool", tags=["5. Support & Admin"])
+async def hash_pool_stats():
+    """Queue depth and timings of the bcrypt worker pool."""
+    return hash_pool.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/admin/rate-limits", tags=["5. Support & Admin"])
+async def rate_limit_stats():
+    """Token bucket and admission counters, plus the room cap (this worker)."""
+    out = rate_limit_snapshot([otp_limiter, otp_verify_limiter, login_limiter, ip_limiter, ws_join_limiter], [login_gate])
+    out["rooms"] = {"active": len(manager.rooms), "max": manager.max_rooms, "rejected": manager.rejected_capacity}
+    return out
+
+@app.get("/api/admin/db-pool", tags=["5. Support & Admin"])
+async def db_pool_stats():
+    """Connections checked out, open sessions and checkout wait times."""
+    return pool_stats.snapshot()
 
 @app.post("/api/admin/approve-agent", tags=["5. Support & Admin"])
-async def approve_ag(req: schemas.AdminApprove, db: Session = Depends(get_db)):
-    agent = db.query(models.User).filter(models.User.id == req.agent_id).first()
-    agent.is_admin_approved = req.approve; db.commit(); return {"msg": "Success"}
+async def approve_ag(req: schemas.AdminApprove, db: AsyncSession = Depends(get_async_db)):
+    [result] = await decisions.apply_approvals(db, [req])
+    if result["status"] == "not_found": raise HTTPException(404, detail="Agent not found")
+    return {"msg": "Success"}
+
+@app.post("/api/admin/approve-agents", tags=["5. Support & Admin"])
+async def approve_agents(req: schemas.BulkAdminApprove, db: AsyncSession = Depends(get_async_db)):
+    """Admin: Approve or revoke many agents in one transaction. Per-agent result: approved / revoked / not_found."""
+    return {"results": await decisions.apply_approvals(db, req.approvals)}
 
 @app.post("/api/agent/service/decision", tags=["5. Support & Admin"])
-async def service_decision(req: schemas.ServiceDecision, db: Session = Depends(get_db)):
-    s = db.query(models.KYCSession).filter(models.KYCSession.room_id == req.room_id).first()
-    if req.status == "approved":
-        if s.service_type == "ACCOUNT_OPENING":
-            db.add(models.Account(user_id=s.customer_id, account_number=str(random.randint(10**9, 10**10-1)), account_type="Savings"))
-        elif s.service_type == "CARD_ISSUANCE":
-            db.add(models.Card(user_id=s.customer_id, card_number=f"4111-{random.randint(1000,9999)}-{random.randint(1000,9999)}", card_type="Debit"))
-        elif s.service_type == "LOAN_APPROVAL":
-            loan = db.query(models.LoanApplication).filter(models.LoanApplication.customer_id == s.customer_id).order_by(models.LoanApplication.id.desc()).first()
-            if loan: loan.status = "approved"
-        elif s.service_type == "KYC":
-            u = db.query(models.User).filter(models.User.id == s.customer_id).first()
-            if u: u.video_kyc_status = "verified"
-    s.status = "completed" if req.status == "approved" else "rejected"
-    db.commit(); return {"message": "Success"}
+async def service_decision(req: schemas.ServiceDecision, db: AsyncSession = Depends(get_async_db)):
+    [result] = await decisions.apply_decisions(db, [req])
+    if result["status"] == "not_found": raise HTTPException(404, detail="Session not found")
+    return {"message": "Success"}
+
+@app.post("/api/agent/service/decisions", tags=["5. Support & Admin"])
+async def service_decisions(req: schemas.BulkServiceDecision, db: AsyncSession = Depends(get_async_db)):
+    """Agent: Decide many sessions in one transaction. Per-room result: completed / rejected / not_found."""
+    return {"results": await decisions.apply_decisions(db, req.decisions)}
 
 @app.post("/api/customer/raise-ticket", tags=["5. Support & Admin"])
-async def raise_ticket(req: schemas.TicketCreate, u: models.User = Depends(get_user), db: Session = Depends(get_db)):
+async def raise_ticket(req: schemas.TicketCreate, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
     db.add(models.Ticket(customer_id=u.id, subject=req.subject, description=req.description))
-    db.commit(); return {"msg": "Ticket Raised Successfully"}
-
-@app.get("/api/customer/my-tickets", tags=["5. Support & Admin"])
-async def get_my_tickets(u: models.User = Depends(get_user), db: Session = Depends(get_db)):
-    """Customer: View the status and feedback of my tickets."""
-    return db.query(models.Ticket).filter(models.Ticket.customer_id == u.id).all()
-
-@app.get("/api/agent/tickets/pending", tags=["5. Support & Admin"])
-async def list_pending_tickets(u: models.User = Depends(get_user), db: Session = Depends(get_db)):
-    """Agent: See all open support tickets."""
+    await db.commit(); return {"msg": "Ticket Raised Successfully"}
+
+@app.get("/api/customer/my-tickets", response_model=List[schemas.TicketOut], tags=["5. Support & Admin"])
+async def get_my_tickets(response: Response, limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    """Customer: View the status and feedback of my tickets. Next page cursor in `X-Next-Cursor`."""
+    q = projection(models.Ticket, schemas.TicketOut).filter(models.Ticket.customer_id == u.id)
+    rows, next_cursor = await export.page(db, q, models.Ticket.id, after_id(cursor), limit)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@app.get("/api/agent/tickets/pending", response_model=List[schemas.TicketOut], tags=["5. Support & Admin"])
+async def list_pending_tickets(response: Response, limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
+    """Agent: See open support tickets, oldest first. Next page cursor in `X-Next-Cursor`."""
     if u.role != "agent": raise HTTPException(403)
-    return db.query(models.Ticket).filter(models.Ticket.status == "open").all()
+    q = projection(models.Ticket, schemas.TicketOut).filter(models.Ticket.status == "open")
+    rows, next_cursor = await export.page(db, q, models.Ticket.id, after_id(cursor), limit)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 @app.post("/api/agent/tickets/resolve", tags=["5. Support & Admin"])
-async def resolve_ticket(req: schemas.TicketResolve, u: models.User = Depends(get_user), db: Session = Depends(get_db)):
+async def resolve_ticket(req: schemas.TicketResolve, u: models.User = Depends(get_user), db: AsyncSession = Depends(get_async_db)):
     """Agent: Resolve a ticket and provide feedback."""
     if u.role != "agent": raise HTTPException(403)
-    ticket = db.query(models.Ticket).filter(models.Ticket.id == req.ticket_id).first()
+    ticket = await db.scalar(select(models.Ticket).filter(models.Ticket.id == req.ticket_id))
     if not ticket: raise HTTPException(404)
     
     ticket.status = req.status
     ticket.agent_feedback = req.feedback
-    db.commit()
+    await db.commit()
     return {"message": "Ticket resolved and feedback sent"}
 
 @app.get("/", include_in_schema=False)
 async def r(): return RedirectResponse(url="/static/index.html")
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "frontend"), html=True), name="static")
+# Fingerprinted + precompressed in memory at import; restart to pick up frontend edits
+static_assets = StaticAssets(os.path.join(BASE_DIR, "frontend"))
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_files(path: str, request: Request):
+    return static_assets.response(path, request.headers)
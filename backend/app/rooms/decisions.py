@@ -0,0 +1,55 @@
+import random
+from typing import Dict, List
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import tokens
+from app.core import models, schemas
+
+async def apply_decisions(db: AsyncSession, decisions: List[schemas.ServiceDecision]) -> List[dict]:
+    """Apply agent decisions with one query per table and a single commit.
+
+    Later entries for the same room win. Returns one result per distinct room, in request order.
+    """
+    wanted: Dict[str, schemas.ServiceDecision] = {}
+    for d in decisions: wanted.pop(d.room_id, None); wanted[d.room_id] = d
+    sessions = {s.room_id: s for s in (await db.scalars(select(models.KYCSession).filter(models.KYCSession.room_id.in_(wanted)))).all()}
+
+    approved = [s for room_id, s in sessions.items() if wanted[room_id].status == "approved"]
+    by_type: Dict[str, List[models.KYCSession]] = {}
+    for s in approved: by_type.setdefault(s.service_type, []).append(s)
+
+    # Latest loan application per customer, matching the single-decision behaviour
+    loan_customers = {s.customer_id for s in by_type.get("LOAN_APPROVAL", [])}
+    if loan_customers:
+        latest = select(func.max(models.LoanApplication.id)).filter(models.LoanApplication.customer_id.in_(loan_customers)).group_by(models.LoanApplication.customer_id)
+        for loan in (await db.scalars(select(models.LoanApplication).filter(models.LoanApplication.id.in_(latest)))).all():
+            loan.status = "approved"
+
+    kyc_customers = {s.customer_id for s in by_type.get("KYC", [])}
+    verified = (await db.scalars(select(models.User).filter(models.User.id.in_(kyc_customers)))).all() if kyc_customers else []
+    for u in verified: u.video_kyc_status = "verified"
+
+    db.add_all([models.Account(user_id=s.customer_id, account_number=str(random.randint(10**9, 10**10-1)), account_type="Savings") for s in by_type.get("ACCOUNT_OPENING", [])])
+    db.add_all([models.Card(user_id=s.customer_id, card_number=f"4111-{random.randint(1000,9999)}-{random.randint(1000,9999)}", card_type="Debit") for s in by_type.get("CARD_ISSUANCE", [])])
+
+    results = []
+    for room_id, d in wanted.items():
+        s = sessions.get(room_id)
+        if s is None: results.append({"room_id": room_id, "status": "not_found"}); continue
+        s.status = "completed" if d.status == "approved" else "rejected"
+        results.append({"room_id": room_id, "status": s.status})
+    await db.commit()
+    for u in verified: tokens.invalidate_principal(u)
+    return results
+
+async def apply_approvals(db: AsyncSession, approvals: List[schemas.AdminApprove]) -> List[dict]:
+    """Set is_admin_approved for many agents in one query and one commit. Later entries win."""
+    wanted = {a.agent_id: a.approve for a in approvals}
+    agents = {u.id: u for u in (await db.scalars(select(models.User).filter(models.User.id.in_(wanted)))).all()}
+    for agent_id, approve in wanted.items():
+        if agent_id in agents: agents[agent_id].is_admin_approved = approve
+    await db.commit()
+    for u in agents.values(): tokens.invalidate_principal(u)
+    return [{"agent_id": agent_id, "status": ("approved" if approve else "revoked") if agent_id in agents else "not_found"} for agent_id, approve in wanted.items()]
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from sqlalchemy import or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import models
+from app.core.database import AsyncSessionLocal
+from app.websocket.connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+class WaitStats:
+    """Rolling queue-wait samples (requested -> claimed) per service type."""
+
+    def __init__(self, window: int = 1000):
+        self.samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.claims = 0
+        self.conflicts = 0
+
+    def record(self, service_type: Optional[str], seconds: float):
+        self.claims += 1
+        self.samples[service_type or "UNKNOWN"].append(seconds)
+
+    def snapshot(self) -> dict:
+        out = {"claims": self.claims, "conflicts": self.conflicts, "wait_seconds": {}}
+        for service_type, values in self.samples.items():
+            ordered = sorted(values)
+            pick = lambda pct: round(ordered[min(len(ordered) - 1, int(pct * len(ordered)))], 3)
+            out["wait_seconds"][service_type] = {"n": len(ordered), "avg": round(sum(ordered) / len(ordered), 3), "p50": pick(0.5), "p95": pick(0.95), "max": round(ordered[-1], 3)}
+        return out
+
+wait_stats = WaitStats()
+
+async def claim(db: AsyncSession, room_id: str, agent_id: int) -> Optional[models.KYCSession]:
+    """Compare-and-set requested -> active. Returns the session if this agent won it, else None."""
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(models.KYCSession)
+        .where(models.KYCSession.room_id == room_id, models.KYCSession.status == "requested")
+        .values(agent_id=agent_id, status="active", accepted_at=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if result.rowcount != 1:
+        wait_stats.conflicts += 1
+        return None
+    s = await db.scalar(select(models.KYCSession).filter(models.KYCSession.room_id == room_id).execution_options(populate_existing=True))
+    if s.requested_at: wait_stats.record(s.service_type, (now - s.requested_at).total_seconds())
+    return s
+
+async def release(db: AsyncSession, room_id: str, agent_id: int):
+    """Undo a claim nobody picked up."""
+    await db.execute(
+        update(models.KYCSession)
+        .where(models.KYCSession.room_id == room_id, models.KYCSession.agent_id == agent_id, models.KYCSession.status == "active")
+        .values(agent_id=None, status="requested", accepted_at=None, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+class Dispatcher:
+    """Matches idle agents (FIFO) to the oldest waiting online customer, by service_type priority."""
+
+    def __init__(self, manager: ConnectionManager, priority: List[str], on_claim: Optional[Callable[[models.KYCSession], None]] = None, interval: float = 0.5, batch: int = 50):
+        self.manager = manager
+        self.priority = priority
+        self.on_claim = on_claim
+        self.interval = interval
+        self.batch = batch
+        self.waiting: Deque[list] = deque()  # [agent_id, future]
+        self._wake = asyncio.Event()
+
+    def poke(self):
+        """Call when a customer may have become available."""
+        self._wake.set()
+
+    async def next_for(self, agent_id: int, timeout: float, is_gone: Optional[Callable[[], Awaitable[bool]]] = None,
+                       check_every: float = 1.0) -> Optional[models.KYCSession]:
+        """Wait up to `timeout` for a claim. `is_gone` (e.g. request.is_disconnected) is checked every
+        `check_every` seconds so an agent whose long-poll dropped leaves the line instead of being assigned."""
+        entry = [agent_id, asyncio.get_running_loop().create_future()]
+        self.waiting.append(entry)
+        self.poke()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            done, _ = await asyncio.wait({entry[1]}, timeout=max(0, min(remaining, check_every if is_gone else remaining)))
+            if done: return entry[1].result()
+            if remaining <= check_every or not is_gone or await is_gone(): break
+        try: self.waiting.remove(entry)
+        except ValueError: pass  # already popped by _match
+        # The claim may have landed while is_gone() was awaited: hand it over (the caller releases it if the
+        # agent is gone) rather than dropping it. Otherwise cancel, so a claim still in flight is released by _match.
+        if entry[1].done(): return entry[1].result()
+        entry[1].cancel()
+        return None
+
+    def _groups(self):
+        """One filter per priority level, highest first; unlisted service types come last."""
+        for service_type in self.priority: yield models.KYCSession.service_type == service_type
+        yield or_(models.KYCSession.service_type.is_(None), models.KYCSession.service_type.notin_(self.priority))
+
+    async def _candidates(self, db: AsyncSession) -> List[str]:
+        """Room ids of up to `batch` requested sessions whose customer is online, in dispatch order.
+        Pages past offline customers (abandoned requests) so they cannot starve the online ones behind them."""
+        found: List[str] = []
+        for group in self._groups():
+            last = None
+            while len(found) < self.batch:
+                q = select(models.KYCSession.room_id, models.KYCSession.requested_at, models.KYCSession.id).filter(models.KYCSession.status == "requested", group)
+                if last is not None: q = q.filter(tuple_(models.KYCSession.requested_at, models.KYCSession.id) > tuple_(*last))
+                rows = (await db.execute(q.order_by(models.KYCSession.requested_at, models.KYCSession.id).limit(self.batch))).all()
+                if not rows: break
+                online = await self.manager.online_rooms([r.room_id for r in rows], "customer")
+                found += [r.room_id for r in rows if r.room_id in online]
+                if len(rows) < self.batch: break
+                last = (rows[-1].requested_at, rows[-1].id)
+            if len(found) >= self.batch: break
+        return found[:self.batch]
+
+    async def _match(self):
+        async with AsyncSessionLocal() as db:
+            for room_id in await self._candidates(db):
+                while self.waiting and self.waiting[0][1].done(): self.waiting.popleft()
+                if not self.waiting: return
+                entry = self.waiting.popleft()
+                agent_id, fut = entry
+                s = await claim(db, room_id, agent_id)
+                if s is None:
+                    if not fut.done(): self.waiting.appendleft(entry)  # lost the race to a manual accept / other worker
+                    continue
+                if fut.done():
+                    await release(db, s.room_id, agent_id)
+                    continue
+                fut.set_result(s)
+                if self.on_claim: self.on_claim(s)
+                logger.info(f"Dispatched room {s.room_id} ({s.service_type}) to agent {agent_id}")
+
+    async def run(self):
+        while True:
+            try: await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError: pass
+            self._wake.clear()
+            if not self.waiting: continue
+            try: await self._match()
+            except Exception as e: logger.error(f"Dispatch pass failed: {e}")
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import models
+from app.core.database import AsyncSessionLocal
+from app.core.pagination import after, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# How long tombstones are kept; change cursors older than this must resync
+REMOVAL_RETENTION = timedelta(hours=1)
+# updated_at / removed_at are stamped in Python before COMMIT, so a row stamped before a poll can become
+# visible after it. Each poll re-reads this much before its cursor; the repeats are harmless because
+# "changed" rows carry the session's current state and "removed" room_ids are final.
+CHANGES_OVERLAP = timedelta(seconds=5)
+
+def record_removals(db: AsyncSession, room_ids: Iterable[str]):
+    db.add_all([models.KYCSessionRemoval(room_id=r) for r in room_ids])
+
+async def pending_page(db: AsyncSession, limit: int, cursor: Optional[str] = None, service_type: Optional[str] = None) -> Tuple[List[models.KYCSession], Optional[str]]:
+    """Oldest-first page of requested sessions (served by ix_kyc_sessions_status_*)."""
+    q = select(models.KYCSession).filter(models.KYCSession.status == "requested")
+    if service_type: q = q.filter(models.KYCSession.service_type == service_type)
+    keyset = after(models.KYCSession.requested_at, models.KYCSession.id, cursor)
+    if keyset is not None: q = q.filter(keyset)
+    rows = (await db.scalars(q.order_by(models.KYCSession.requested_at, models.KYCSession.id).limit(limit + 1))).all()
+    next_cursor = encode_cursor(rows[limit - 1].requested_at, rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def changes_cursor(at: datetime) -> str:
+    return encode_cursor(at)
+
+async def pending_changes(db: AsyncSession, since: str, service_type: Optional[str] = None) -> Tuple[List[models.KYCSession], List[str], str]:
+    """Sessions touched and room_ids deleted after `since` (minus CHANGES_OVERLAP), plus the cursor for the next poll.
+    Clients apply the result as upserts by room_id, so entries repeated from the overlap change nothing."""
+    try:
+        since_at = datetime.fromisoformat(decode_cursor(since, 1)[0])
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    now = datetime.utcnow()
+    if since_at < now - REMOVAL_RETENTION:
+        raise HTTPException(410, "Cursor expired, reload the full queue")
+
+    since_at -= CHANGES_OVERLAP
+    q = select(models.KYCSession).filter(models.KYCSession.updated_at > since_at, models.KYCSession.updated_at <= now)
+    if service_type: q = q.filter(models.KYCSession.service_type == service_type)
+    changed = (await db.scalars(q.order_by(models.KYCSession.updated_at))).all()
+    removed = (await db.scalars(select(models.KYCSessionRemoval.room_id).filter(
+        models.KYCSessionRemoval.removed_at > since_at, models.KYCSessionRemoval.removed_at <= now))).all()
+    return changed, list(removed), changes_cursor(now)
+
+async def purge_removals_forever(interval: float):
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(models.KYCSessionRemoval).where(models.KYCSessionRemoval.removed_at < datetime.utcnow() - REMOVAL_RETENTION))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Removal purge failed: {e}")
+        await asyncio.sleep(interval)
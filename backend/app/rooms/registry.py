@@ -0,0 +1,82 @@
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (room_id, role, raw_text) -> delivers a frame to a socket held by this worker
+Deliver = Callable[[str, str, str], Awaitable[None]]
+# raw_text -> handles a cluster-wide announcement on this worker
+Announce = Callable[[str], Awaitable[None]]
+Rejection = Optional[Tuple[int, str]]
+
+def admit(present: Optional[Set[str]], role: str) -> Rejection:
+    """Room join rules. `present` is None when the room does not exist yet."""
+    # 1. INITIALIZE ROOM (ONLY FOR CUSTOMER)
+    if present is None and role != "customer":
+        return 4003, "Only a Customer can start a room."
+    present = present or set()
+    # 2. AGENT JOIN CHECK
+    if role == "agent" and "customer" not in present:
+        return 4003, "Customer is not in this room."
+    # 3. CAPACITY CHECK
+    if len(present) >= 2:
+        return 4001, "Room is full."
+    if role in present:
+        return 4002, f"An {role} is already present."
+    return None
+
+class RoomRegistry:
+    """Cluster-wide view of who is in which room, plus frame routing to the worker holding a peer."""
+
+    async def start(self, deliver: Deliver, announce: Optional[Announce] = None): raise NotImplementedError
+    async def stop(self): pass
+    async def join(self, room_id: str, role: str) -> Rejection: raise NotImplementedError
+    def leave(self, room_id: str, role: str): raise NotImplementedError
+    async def roles(self, room_id: str) -> Set[str]: raise NotImplementedError
+    async def online(self, room_ids: Iterable[str], role: str) -> Set[str]: raise NotImplementedError
+    async def publish(self, room_id: str, role: str, data: str): raise NotImplementedError
+    async def announce(self, data: str): raise NotImplementedError
+
+class InMemoryRegistry(RoomRegistry):
+    """Single-process registry; publish delivers straight back to the local manager."""
+
+    def __init__(self):
+        self.rooms: Dict[str, Set[str]] = {}
+        self._deliver: Optional[Deliver] = None
+        self._announce: Optional[Announce] = None
+
+    async def start(self, deliver: Deliver, announce: Optional[Announce] = None):
+        self._deliver, self._announce = deliver, announce
+
+    async def join(self, room_id: str, role: str) -> Rejection:
+        rejected = admit(self.rooms.get(room_id), role)
+        if not rejected:
+            self.rooms.setdefault(room_id, set()).add(role)
+        return rejected
+
+    def leave(self, room_id: str, role: str):
+        roles = self.rooms.get(room_id)
+        if roles is None: return
+        roles.discard(role)
+        if not roles: del self.rooms[room_id]
+
+    async def roles(self, room_id: str) -> Set[str]:
+        return set(self.rooms.get(room_id, ()))
+
+    async def online(self, room_ids: Iterable[str], role: str) -> Set[str]:
+        return {r for r in room_ids if role in self.rooms.get(r, ())}
+
+    async def publish(self, room_id: str, role: str, data: str):
+        if self._deliver and role in self.rooms.get(room_id, ()):
+            await self._deliver(room_id, role, data)
+
+    async def announce(self, data: str):
+        if self._announce: await self._announce(data)
+
+def create_registry(kind: str, socket_path: str) -> RoomRegistry:
+    if kind == "memory":
+        return InMemoryRegistry()
+    if kind == "local":
+        from app.rooms.unix_socket import UnixSocketRegistry
+        return UnixSocketRegistry(socket_path)
+    raise ValueError(f"Unknown ROOM_REGISTRY: {kind}")
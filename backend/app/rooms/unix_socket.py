@@ -0,0 +1,269 @@
+"""Multi-process room registry over a local Unix socket.
+
+One hub process owns the room table and routes frames; every uvicorn worker
+connects to it as a client. The first worker that finds no hub starts one
+in-process. If that worker dies, the others reconnect with backoff, one of
+them binds a fresh hub and each re-registers the peers it still holds.
+Or run the hub standalone (under a supervisor) with:
+
+    python -m app.rooms.unix_socket /tmp/kyc-rooms.sock
+"""
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import sys
+from contextlib import suppress
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from app.rooms.registry import Announce, Deliver, Rejection, RoomRegistry, admit
+
+logger = logging.getLogger(__name__)
+
+STREAM_LIMIT = 16 * 1024 * 1024  # SDP offers and chat frames travel as single lines (callers cap them well below this)
+RECONNECT_BACKOFF = (0.05, 2.0)  # first and max delay between reconnect attempts (seconds)
+
+def _encode(msg: dict) -> bytes:
+    # ensure_ascii=False: \uXXXX escapes would blow non-ASCII text up to 6x on the wire
+    return json.dumps(msg, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+
+async def _readline(reader: asyncio.StreamReader) -> bytes:
+    """readline() that skips a line longer than STREAM_LIMIT instead of failing the whole connection.
+    b"" at EOF, like readline()."""
+    skipping = False
+    while True:
+        try: line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e: return e.partial
+        except asyncio.LimitOverrunError as e:
+            # Throw away what is buffered; the rest of the line (up to its newline) is dropped on the next pass
+            if not skipping: logger.error("Room hub line over STREAM_LIMIT dropped")
+            await reader.read(e.consumed)
+            skipping = True
+            continue
+        if not skipping: return line
+        skipping = False
+
+class RoomHub:
+    """Owns room membership for every worker connected to the socket."""
+
+    def __init__(self):
+        # room_id -> { role: connection id }
+        self.rooms: Dict[str, Dict[str, int]] = {}
+        self.conns: Dict[int, asyncio.StreamWriter] = {}
+        self._ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def serve(self, path: str):
+        self._server = await asyncio.start_unix_server(self._handle, path=path, limit=STREAM_LIMIT)
+        logger.info(f"Room hub listening on {path}")
+
+    async def close(self):
+        for writer in list(self.conns.values()): writer.close()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn_id = next(self._ids)
+        self.conns[conn_id] = writer
+        try:
+            while line := await _readline(reader):
+                reply = self._dispatch(conn_id, json.loads(line))
+                if reply is not None:
+                    writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # Worker died: forget every peer it was holding
+            del self.conns[conn_id]
+            for room_id, roles in list(self.rooms.items()):
+                for role in [r for r, owner in roles.items() if owner == conn_id]: del roles[role]
+                if not roles: del self.rooms[room_id]
+            writer.close()
+
+    def _dispatch(self, conn_id: int, m: dict) -> Optional[dict]:
+        op = m["op"]
+        if op == "join":
+            present = self.rooms.get(m["room"])
+            rejected = admit(set(present) if present is not None else None, m["role"])
+            if not rejected:
+                self.rooms.setdefault(m["room"], {})[m["role"]] = conn_id
+            return {"id": m["id"], "rejected": rejected}
+        if op == "leave":
+            roles = self.rooms.get(m["room"], {})
+            if roles.get(m["role"]) == conn_id:
+                del roles[m["role"]]
+                if not roles: del self.rooms[m["room"]]
+            return None
+        if op == "restore":
+            # A worker reconnecting after a hub restart re-registers the peers it holds
+            conflicts = []
+            for room_id, role in m["peers"]:
+                owner = self.rooms.get(room_id, {}).get(role)
+                if owner not in (None, conn_id): conflicts.append([room_id, role]); continue
+                self.rooms.setdefault(room_id, {})[role] = conn_id
+            return {"id": m["id"], "conflicts": conflicts}
+        if op == "roles":
+            return {"id": m["id"], "roles": list(self.rooms.get(m["room"], {}))}
+        if op == "online":
+            return {"id": m["id"], "rooms": [r for r in m["rooms"] if m["role"] in self.rooms.get(r, {})]}
+        if op == "publish":
+            owner = self.rooms.get(m["room"], {}).get(m["role"])
+            if owner in self.conns:
+                self.conns[owner].write(_encode({"op": "deliver", "room": m["room"], "role": m["role"], "data": m["data"]}))
+            return None
+        if op == "announce":
+            frame = _encode({"op": "announce", "data": m["data"]})
+            for writer in self.conns.values(): writer.write(frame)
+            return None
+        raise ValueError(f"Unknown hub op: {op}")
+
+class UnixSocketRegistry(RoomRegistry):
+    """Client side of the hub; one instance per worker process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hub: Optional[RoomHub] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._listener: Optional[asyncio.Task] = None
+        self._deliver: Optional[Deliver] = None
+        self._announce: Optional[Announce] = None
+        # Peers admitted for sockets on this worker, replayed to a restarted hub
+        self.local: Set[Tuple[str, str]] = set()
+        self.reconnects = 0
+
+    async def start(self, deliver: Deliver, announce: Optional[Announce] = None):
+        self._deliver, self._announce = deliver, announce
+        if not await self._connect(5):
+            raise RuntimeError(f"Could not reach room hub at {self.path}")
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"Connected to room hub at {self.path}")
+
+    async def _connect(self, attempts: int) -> bool:
+        for _ in range(attempts):
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path, limit=STREAM_LIMIT)
+                return True
+            except (FileNotFoundError, ConnectionRefusedError):
+                await self._start_hub()
+        return False
+
+    async def _reconnect(self):
+        """Back off until a hub answers (electing ourselves if none does), then restore our peers."""
+        delay = RECONNECT_BACKOFF[0]
+        while not await self._connect(1):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_BACKOFF[1])
+        self.reconnects += 1
+        if self.local:
+            self._writer.write(_encode({"op": "restore", "id": 0, "peers": [list(p) for p in self.local]}))
+            await self._writer.drain()
+        logger.info(f"Reconnected to room hub at {self.path} ({len(self.local)} peers restored, hub {'here' if self.hub else 'elsewhere'})")
+
+    async def _start_hub(self):
+        # The lock file makes "probe, clear a stale socket, bind" atomic between workers, so two of them
+        # re-electing at once cannot unlink each other's fresh hub
+        with open(self.path + ".lock", "w") as lock:
+            try: fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                await asyncio.sleep(0.05); return  # another worker is electing itself
+            try:
+                _, w = await asyncio.open_unix_connection(self.path)
+                w.close(); return  # a hub is up after all
+            except ConnectionRefusedError:
+                os.unlink(self.path)  # dead hub left its socket file behind
+            except FileNotFoundError:
+                pass
+            hub = RoomHub()
+            await hub.serve(self.path)
+            self.hub = hub
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError): await self._listener
+        if self._writer: self._writer.close()
+        if self.hub: await self.hub.close()
+
+    async def _listen(self):
+        while True:
+            try:
+                while line := await _readline(self._reader):
+                    m = json.loads(line)
+                    if m.get("id") == 0:  # restore reply
+                        for room_id, role in m["conflicts"]: logger.warning(f"Room hub gave {role} of {room_id} to another worker")
+                    elif "id" in m:
+                        fut = self._pending.pop(m["id"], None)
+                        if fut and not fut.done(): fut.set_result(m)
+                    elif m.get("op") == "deliver" and self._deliver:
+                        await self._deliver(m["room"], m["role"], m["data"])
+                    elif m.get("op") == "announce" and self._announce:
+                        await self._announce(m["data"])
+                logger.error("Room hub closed the connection")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Room hub connection lost: {e}")
+            self._writer.close()
+            self._writer = None
+            for fut in self._pending.values():
+                if not fut.done(): fut.set_exception(ConnectionError("Room hub connection lost"))
+            self._pending.clear()
+            await self._reconnect()
+
+    def _send(self, msg: dict):
+        if self._writer is None: raise ConnectionError("Room hub unavailable, reconnecting")
+        frame = _encode(msg)
+        if len(frame) > STREAM_LIMIT: raise ValueError(f"{msg['op']} frame of {len(frame)} bytes exceeds STREAM_LIMIT")
+        self._writer.write(frame)
+
+    async def _call(self, msg: dict) -> dict:
+        msg["id"] = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[msg["id"]] = fut
+        try:
+            self._send(msg)
+            await self._writer.drain()
+        except Exception:
+            self._pending.pop(msg["id"], None)
+            raise
+        return await fut
+
+    async def join(self, room_id: str, role: str) -> Rejection:
+        rejected = (await self._call({"op": "join", "room": room_id, "role": role}))["rejected"]
+        if rejected: return tuple(rejected)
+        self.local.add((room_id, role))
+        return None
+
+    def leave(self, room_id: str, role: str):
+        self.local.discard((room_id, role))
+        if self._writer is not None: self._send({"op": "leave", "room": room_id, "role": role})
+
+    async def roles(self, room_id: str) -> Set[str]:
+        return set((await self._call({"op": "roles", "room": room_id}))["roles"])
+
+    async def online(self, room_ids: Iterable[str], role: str) -> Set[str]:
+        return set((await self._call({"op": "online", "rooms": list(room_ids), "role": role}))["rooms"])
+
+    async def publish(self, room_id: str, role: str, data: str):
+        self._send({"op": "publish", "room": room_id, "role": role, "data": data})
+        await self._writer.drain()
+
+    async def announce(self, data: str):
+        self._send({"op": "announce", "data": data})
+        await self._writer.drain()
+
+async def _serve_forever(path: str):
+    hub = RoomHub()
+    await hub.serve(path)
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve_forever(sys.argv[1] if len(sys.argv) > 1 else "/tmp/kyc-rooms.sock"))
@@ -0,0 +1,34 @@
+"""JSON codec for signaling frames. Uses orjson when installed, stdlib json otherwise."""
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    loads = orjson.loads
+    BACKEND = "orjson"
+except ImportError:  # pragma: no cover - depends on environment
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+    loads = json.loads
+    BACKEND = "json"
+
+_PREFIX = '{"type":"'
+
+def peek_type(frame: str) -> Optional[str]:
+    """Top-level "type" of a frame without parsing the body.
+
+    Browsers emit JSON.stringify({type: ...}) so the key is almost always
+    first; anything else falls back to a full parse. Raises ValueError on
+    malformed JSON, like json.loads.
+    """
+    if frame.startswith(_PREFIX):
+        end = frame.find('"', len(_PREFIX))
+        if end != -1 and "\\" not in frame[len(_PREFIX):end]:
+            return frame[len(_PREFIX):end]
+    m = loads(frame)
+    return m.get("type") if isinstance(m, dict) else None
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+ICE_TYPES = frozenset(["ice-candidate", "ice-candidates"])
+
+class IceCoalescer:
+    """Holds trickled ICE frames per (room, target) for a short window and forwards them as one
+    {"type": "batch", "frames": [...]} frame. The batch is built by joining the raw frames, so
+    nothing is re-parsed. Call flush() before relaying any other frame to keep ordering."""
+
+    def __init__(self, send: Callable[[str, str, str, int], Awaitable[None]], window: float):
+        # send(room_id, target_role, frame, frames_folded_in)
+        self.send = send
+        self.window = window
+        self._buffers: Dict[Tuple[str, str], List[str]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def push(self, room_id: str, target_role: str, frame: str):
+        if self.window <= 0:
+            await self.send(room_id, target_role, frame, 1)
+            return
+        key = (room_id, target_role)
+        self._buffers.setdefault(key, []).append(frame)
+        if key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: Tuple[str, str]):
+        await asyncio.sleep(self.window)
+        self._timers.pop(key, None)
+        await self._send_buffer(key)
+
+    async def _send_buffer(self, key: Tuple[str, str]):
+        frames = self._buffers.pop(key, None)
+        if not frames: return
+        data = frames[0] if len(frames) == 1 else '{"type":"batch","frames":[' + ",".join(frames) + "]}"
+        try:
+            await self.send(key[0], key[1], data, len(frames))
+        except Exception as e:
+            logger.error(f"ICE batch send failed for room {key[0]}: {e}")
+
+    async def flush(self, room_id: str, target_role: str):
+        key = (room_id, target_role)
+        timer = self._timers.pop(key, None)
+        if timer: timer.cancel()
+        await self._send_buffer(key)
+
+    def drop_room(self, room_id: str):
+        for key in [k for k in self._buffers if k[0] == room_id]:
+            timer = self._timers.pop(key, None)
+            if timer: timer.cancel()
+            del self._buffers[key]
@@ -0,0 +1,251 @@
+"""Write-behind journal of room events: joins, leaves, chat, close-session, purges.
+
+record() only appends to a bounded in-memory queue, so signaling never waits on
+disk or the database. One task drains the queue in batches (`batch` events or
+`flush_interval` seconds, whichever comes first) and hands each batch to a sink:
+NDJSON segment files or one bulk INSERT into `session_events`. A full queue is
+the backpressure point: record() drops the event and counts it, write() (for
+callers that can afford to wait) blocks until there is room. Retention runs on
+its own timer (`prune_every`), so it holds even when nothing is being written.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, insert
+
+from app.core import metrics, models
+from app.core.database import AsyncSessionLocal
+from app.signaling import codec
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[datetime, str, str, Optional[str], Optional[str]]  # (at, kind, room_id, role, payload)
+
+class FileSink:
+    """Appends NDJSON lines to `events-<start>-<pid>-<n>.ndjson`, starting a new segment past `segment_bytes`
+    or `segment_seconds`. Each batch is one write + flush (to the OS, not fsync); segments are fsynced when closed.
+    prune() deletes closed segments older than `retention` or beyond `max_bytes` in total (oldest first)."""
+
+    def __init__(self, directory: str, segment_bytes: int, retention: Optional[timedelta] = None, max_bytes: int = 0,
+                 segment_seconds: float = 86400):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.segments = 0
+        self.pruned = 0
+        self._file = None
+        self._size = 0
+        self._opened = 0.0
+        self._lock = threading.Lock()  # flush and prune run in worker threads
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def current(self) -> Optional[str]:
+        return self._file.name if self._file else None
+
+    def _roll(self):
+        self._close()
+        self._prune()
+        name = f"events-{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}-{self.segments}.ndjson"
+        self._file = open(os.path.join(self.directory, name), "ab")
+        self._size = 0
+        self._opened = time.monotonic()
+        self.segments += 1
+
+    def _expired(self) -> bool:
+        return self._file is not None and time.monotonic() - self._opened > self.segment_seconds
+
+    async def prune(self):
+        await asyncio.to_thread(self._prune_idle)
+
+    def _prune_idle(self):
+        with self._lock:
+            # Close a segment that aged out without traffic, so retention can reach it; the next write opens a new one
+            if self._expired(): self._close()
+            self._prune()
+
+    def _prune(self):
+        """Blocking. Applies retention to closed segments (other workers' open segments are at most a day old and small enough to survive)."""
+        if not self.retention and not self.max_bytes: return
+        segments = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith("events-") and name.endswith(".ndjson")): continue
+            path = os.path.join(self.directory, name)
+            if self._file and path == self._file.name: continue
+            try: st = os.stat(path)
+            except FileNotFoundError: continue
+            segments.append((st.st_mtime, st.st_size, path))
+        segments.sort()
+        cutoff = time.time() - self.retention.total_seconds() if self.retention else None
+        total = sum(size for _, size, _ in segments)
+        for mtime, size, path in segments:
+            if not ((cutoff and mtime < cutoff) or (self.max_bytes and total > self.max_bytes)): break
+            with suppress(FileNotFoundError): os.unlink(path); self.pruned += 1
+            total -= size
+
+    def _write(self, events: List[Event]):
+        data = "".join(codec.dumps({"at": at.isoformat(), "kind": kind, "room_id": room_id, "role": role, "payload": payload}) + "\n"
+                       for at, kind, room_id, role, payload in events).encode("utf-8")
+        with self._lock:
+            # Roll when full or old, or when another worker's prune removed our (long idle) segment
+            if (self._file is None or (self._size and self._size + len(data) > self.segment_bytes) or self._expired()
+                    or not os.path.exists(self._file.name)): self._roll()
+            self._file.write(data); self._file.flush()
+            self._size += len(data)
+
+    async def flush(self, events: List[Event]):
+        await asyncio.to_thread(self._write, events)
+
+    def close(self):
+        with self._lock: self._close()
+
+    def _close(self):
+        if self._file:
+            os.fsync(self._file.fileno()); self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        return {"sink": "file", "directory": self.directory, "segment": self.current, "segments": self.segments, "pruned": self.pruned}
+
+class DatabaseSink:
+    """One executemany INSERT into session_events per batch, on a short-lived session.
+    prune() deletes rows older than `retention`."""
+
+    def __init__(self, retention: Optional[timedelta] = None):
+        self.retention = retention
+        self.pruned = 0
+
+    async def flush(self, events: List[Event]):
+        rows = [{"at": at, "kind": kind, "room_id": room_id, "role": role, "payload": payload} for at, kind, room_id, role, payload in events]
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(models.SessionEvent), rows)
+            await db.commit()
+
+    async def prune(self):
+        if not self.retention: return
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(models.SessionEvent).where(models.SessionEvent.at < datetime.utcnow() - self.retention))
+            await db.commit()
+            self.pruned += result.rowcount or 0
+
+    def close(self): pass
+
+    def stats(self) -> dict:
+        return {"sink": "database", "pruned": self.pruned}
+
+class EventJournal:
+    def __init__(self, sink, max_queue: int, batch: int, flush_interval: float, prune_every: float = 3600):
+        self.sink = sink
+        self.prune_every = prune_every
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.batch_size = max(1, batch)
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+        self._pruner: Optional[asyncio.Task] = None
+        self._batch: List[Event] = []  # taken off the queue, not yet handed to the sink
+        self._inflight: Optional[asyncio.Future] = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.flush_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def record(self, kind: str, room_id: str, role: Optional[str] = None, payload: Optional[str] = None):
+        """Non-blocking; drops the event when the queue is full."""
+        if self.sink is None: return
+        try:
+            self.queue.put_nowait((datetime.utcnow(), kind, room_id, role, payload))
+            self.recorded += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.journal_dropped.inc()
+
+    async def write(self, kind: str, room_id: str, role: Optional[str] = None, payload: Optional[str] = None):
+        """Like record(), but waits for queue space instead of dropping."""
+        if self.sink is None: return
+        await self.queue.put((datetime.utcnow(), kind, room_id, role, payload))
+        self.recorded += 1
+
+    async def start(self):
+        if self.sink is None: return
+        self._task = asyncio.create_task(self._run())
+        self._pruner = asyncio.create_task(self._prune_forever())
+
+    async def stop(self):
+        """Flush everything still queued, then close the sink."""
+        if self.sink is None: return
+        for task in (self._pruner, self._task):
+            if task:
+                task.cancel()
+                with suppress(asyncio.CancelledError): await task
+        if self._inflight: await self._inflight
+        pending, self._batch = self._batch, []
+        while not self.queue.empty(): pending.append(self.queue.get_nowait())
+        for i in range(0, len(pending), self.batch_size):
+            await self._flush(pending[i:i + self.batch_size])
+        await asyncio.to_thread(self.sink.close)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                if not self.queue.empty(): self._batch.append(self.queue.get_nowait()); continue
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try: self._batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError: break
+            batch, self._batch = self._batch, []
+            # Shielded so shutdown cancelling this loop never abandons a half-written batch
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _prune_forever(self):
+        while True:
+            try: await self.sink.prune()
+            except Exception as e: logger.error(f"Journal prune failed: {e}")
+            await asyncio.sleep(self.prune_every)
+
+    async def _flush(self, batch: List[Event]):
+        started = time.perf_counter()
+        try:
+            await self.sink.flush(batch)
+            self.written += len(batch); self.batches += 1
+            metrics.journal_events.inc(amount=len(batch))
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Journal flush of {len(batch)} events failed: {e}")
+        elapsed = time.perf_counter() - started
+        self.flush_seconds += elapsed
+        metrics.journal_flush_seconds.observe(elapsed)
+
+    def stats(self) -> dict:
+        if self.sink is None: return {"enabled": False}
+        return {"enabled": True, **self.sink.stats(), "queued": self.queue.qsize(), "max_queue": self.queue.maxsize,
+                "recorded": self.recorded, "written": self.written, "dropped": self.dropped, "failed": self.failed, "batches": self.batches,
+                "avg_batch": round(self.written / self.batches, 1) if self.batches else None,
+                "avg_flush_ms": round(self.flush_seconds * 1000 / self.batches, 2) if self.batches else None}
+
+def create_journal(kind: str, directory: str, segment_bytes: int, max_queue: int, batch: int, flush_ms: int,
+                   retention_days: float = 0, max_bytes: int = 0) -> EventJournal:
+    retention = timedelta(days=retention_days) if retention_days else None
+    if kind == "off": sink = None
+    elif kind == "file": sink = FileSink(os.path.expanduser(directory), segment_bytes, retention, max_bytes)
+    elif kind == "database": sink = DatabaseSink(retention)
+    else: raise ValueError(f"Unknown JOURNAL: {kind}")
+    return EventJournal(sink, max_queue, batch, flush_ms / 1000)
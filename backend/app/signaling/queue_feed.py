@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from fastapi import WebSocket
+
+from app.signaling import codec
+from app.websocket.connection_manager import ConnectionManager, Outbox
+
+logger = logging.getLogger(__name__)
+
+class QueueFeed:
+    """Pushes pending-queue deltas to agent sockets.
+
+    Producers call publish() with a partial queue row; rows for the same room
+    are merged for `window` seconds, then sent as one pre-serialized
+    {"type": "queue-delta", "changes": [...]} frame through the registry so
+    agents on every worker receive it. Each subscriber has its own Outbox, so
+    fan-out only enqueues and a slow agent never holds up the registry listener.
+    """
+
+    def __init__(self, manager: ConnectionManager, window: float = 0.1):
+        self.manager = manager
+        self.window = window
+        self.agents: Dict[WebSocket, Outbox] = {}
+        self._pending: Dict[str, dict] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        manager.presence_listeners.append(self._presence)
+        manager.on_announce = self._fan_out
+
+    def publish(self, room_id: str, **fields):
+        row = self._pending.setdefault(room_id, {"room_id": room_id})
+        if fields.get("removed"): row.clear(); row["room_id"] = room_id
+        row.update({k: v.isoformat() if isinstance(v, datetime) else v for k, v in fields.items()})
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    def _presence(self, event: str, room_id: str, role: str):
+        if role == "customer":
+            self.publish(room_id, is_customer_online=(event == "joined"))
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        changes, self._pending = list(self._pending.values()), {}
+        if not changes: return
+        try:
+            await self.manager.registry.announce(codec.dumps({"type": "queue-delta", "changes": changes}))
+        except Exception as e:
+            logger.error(f"Queue feed announce failed: {e}")
+
+    async def _fan_out(self, data: str):
+        for ws, outbox in list(self.agents.items()):
+            if outbox.put(data): continue
+            logger.warning("Dropping queue feed subscriber: outbound queue full")
+            self._drop(ws)
+            asyncio.create_task(ws.close(code=1013, reason="Too slow"))
+
+    def _drop(self, websocket: WebSocket):
+        outbox = self.agents.pop(websocket, None)
+        if outbox: outbox.close()
+
+    async def serve(self, websocket: WebSocket):
+        await websocket.accept()
+        self.agents[websocket] = Outbox(websocket, self.manager.outbound_queue)
+        logger.info(f"Queue feed: agent subscribed ({len(self.agents)} total)")
+        try:
+            while True: await websocket.receive_text()  # clients only listen; keeps disconnect detection
+        finally:
+            self._drop(websocket)
@@ -0,0 +1,63 @@
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Optional
+
+class CallCounters:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.frames_in: Counter = Counter()
+        self.frames_out = 0
+        self.ice_folded = 0  # ICE frames merged into another frame instead of sent on their own
+        self.time_to_connect: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "frames_in": dict(self.frames_in),
+            "messages_in": sum(self.frames_in.values()),
+            "frames_out": self.frames_out,
+            "ice_folded": self.ice_folded,
+            "time_to_connect_ms": round(self.time_to_connect * 1000, 1) if self.time_to_connect is not None else None,
+        }
+
+class CallStats:
+    """Per-room signaling message counters, plus a rolling window of finished calls.
+    Counters exist from begin() to finish(); frames for rooms without a running call are not counted."""
+
+    def __init__(self, history: int = 500):
+        self.rooms: Dict[str, CallCounters] = {}
+        self.finished: Deque[dict] = deque(maxlen=history)
+
+    def begin(self, room_id: str):
+        """Start the clock for a call (agent joined the customer)."""
+        self.rooms[room_id] = CallCounters()
+
+    def frame_in(self, room_id: str, kind: Optional[str]):
+        c = self.rooms.get(room_id)
+        if c: c.frames_in[kind or "unknown"] += 1
+
+    def frame_out(self, room_id: str, folded: int = 1):
+        c = self.rooms.get(room_id)
+        if c is None: return
+        c.frames_out += 1
+        c.ice_folded += folded - 1
+
+    def connected(self, room_id: str):
+        c = self.rooms.get(room_id)
+        if c and c.time_to_connect is None: c.time_to_connect = time.monotonic() - c.started
+
+    def finish(self, room_id: str):
+        c = self.rooms.pop(room_id, None)
+        if c: self.finished.append(c.as_dict())
+
+    def snapshot(self) -> dict:
+        done = list(self.finished)
+        connects = sorted(d["time_to_connect_ms"] for d in done if d["time_to_connect_ms"] is not None)
+        return {
+            "active": {room_id: c.as_dict() for room_id, c in self.rooms.items()},
+            "finished_calls": len(done),
+            "avg_messages_in_per_call": round(sum(d["messages_in"] for d in done) / len(done), 1) if done else None,
+            "avg_frames_out_per_call": round(sum(d["frames_out"] for d in done) / len(done), 1) if done else None,
+            "p50_time_to_connect_ms": connects[len(connects) // 2] if connects else None,
+        }
+
+call_stats = CallStats()
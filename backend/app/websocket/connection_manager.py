@@ -1,76 +1,208 @@
-import json
+import asyncio
 import logging
-from typing import Dict
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
 from fastapi import WebSocket
 
+from app.core.config import settings
+from app.core import metrics
+from app.rooms.registry import RoomRegistry, InMemoryRegistry, create_registry
+from app.signaling import codec
+
 logger = logging.getLogger(__name__)
 
+PING_FRAME = '{"type":"ping"}'
+
+class Outbox:
+    """Per-socket send queue drained by its own task, so a slow peer never blocks the sender."""
+
+    def __init__(self, websocket: WebSocket, maxsize: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.sent = 0
+        self.dropped = 0
+        self._task = asyncio.create_task(self._drain())
+
+    def put(self, data: str) -> bool:
+        try:
+            self.queue.put_nowait((time.perf_counter(), data))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.ws_outbox_dropped.inc()
+            return False
+
+    async def _drain(self):
+        while True:
+            queued_at, data = await self.queue.get()
+            try:
+                await self.websocket.send_text(data)
+                self.sent += 1
+                metrics.ws_outbox_seconds.observe(time.perf_counter() - queued_at)
+            except Exception as e:
+                logger.error(f"Outbound send failed: {e}")
+                return
+
+    def close(self):
+        self._task.cancel()
+
 class ConnectionManager:
-    def __init__(self):
-        # Maps room_id -> { "agent": ws, "customer": ws }
+    def __init__(self, registry: Optional[RoomRegistry] = None, outbound_queue: int = 256, max_rooms: int = 0):
+        # Maps room_id -> { "agent": ws, "customer": ws } for sockets held by THIS worker
         self.rooms: Dict[str, Dict[str, WebSocket]] = {}
+        self.outboxes: Dict[WebSocket, Outbox] = {}
+        self.outbound_queue = outbound_queue
+        self.max_rooms = max_rooms
+        self.rejected_capacity = 0
+        # Cluster-wide membership and cross-worker routing
+        self.registry = registry or InMemoryRegistry()
+        # (event, room_id, role) callbacks for "joined"/"left"; must not block
+        self.presence_listeners: List[Callable[[str, str, str], None]] = []
+        # Handler for cluster-wide announcements (see RoomRegistry.announce)
+        self.on_announce: Optional[Callable[[str], Awaitable[None]]] = None
+        # Heartbeat: monotonic time of the last inbound frame per local socket
+        self.last_seen: Dict[WebSocket, float] = {}
+        self.reaped: Dict[str, int] = {"agent": 0, "customer": 0}
+
+    async def start(self):
+        await self.registry.start(self._deliver, self._announce)
+
+    async def _announce(self, data: str):
+        if self.on_announce: await self.on_announce(data)
+
+    def _notify(self, event: str, room_id: str, role: str):
+        for listener in self.presence_listeners:
+            try: listener(event, room_id, role)
+            except Exception as e: logger.error(f"Presence listener failed: {e}")
+
+    async def stop(self):
+        await self.registry.stop()
 
     async def connect(self, websocket: WebSocket, room_id: str, client_id: str, role: str):
         role = role.lower().strip()
         logger.info(f"Join Attempt: Room={room_id}, Role={role}")
 
-        # 1. INITIALIZE ROOM (ONLY FOR CUSTOMER)
-        if room_id not in self.rooms:
-            if role != "customer":
-                logger.warning(f"BLOCKED: {role} tried to create room {room_id}")
-                await websocket.close(code=4003, reason="Only a Customer can start a room.")
-                return False
-            self.rooms[room_id] = {}
-
-        # 2. AGENT JOIN CHECK
-        if role == "agent" and "customer" not in self.rooms[room_id]:
-            logger.warning(f"BLOCKED: Agent {client_id} tried to join room {room_id} without a Customer.")
-            # Safety: If room was empty/broken, delete it
-            if not self.rooms[room_id]: del self.rooms[room_id]
-            await websocket.close(code=4003, reason="Customer is not in this room.")
-            return False
-        
-        # 3. CAPACITY CHECK
-        if len(self.rooms[room_id]) >= 2:
-            await websocket.close(code=4001, reason="Room is full.")
+        # Admission: only new rooms count against the cap, so a peer can always join an existing call
+        if self.max_rooms and room_id not in self.rooms and len(self.rooms) >= self.max_rooms:
+            self.rejected_capacity += 1
+            logger.warning(f"BLOCKED: room {room_id}: {len(self.rooms)} active rooms (cap {self.max_rooms})")
+            await websocket.accept()  # so the client sees close code 1013 rather than a 403 handshake rejection
+            await websocket.close(code=1013, reason="Server at capacity")
             return False
-        
-        if role in self.rooms[room_id]:
-            await websocket.close(code=4002, reason=f"An {role} is already present.")
+
+        # Room rules (creator, agent-after-customer, capacity) are enforced atomically by the registry
+        rejected = await self.registry.join(room_id, role)
+        if rejected:
+            code, reason = rejected
+            logger.warning(f"BLOCKED: {role} {client_id} -> room {room_id}: {reason}")
+            await websocket.close(code=code, reason=reason)
             return False
 
         # SUCCESS
-        await websocket.accept()
-        self.rooms[room_id][role] = websocket
+        try:
+            await websocket.accept()
+        except Exception:
+            self.registry.leave(room_id, role)
+            raise
+        self.rooms.setdefault(room_id, {})[role] = websocket
+        self.outboxes[websocket] = Outbox(websocket, self.outbound_queue)
+        self.last_seen[websocket] = time.monotonic()
         logger.info(f"ACTIVE: {role} connected to room {room_id}")
+        self._notify("joined", room_id, role)
         
         target_role = "customer" if role == "agent" else "agent"
-        if target_role in self.rooms[room_id]:
+        if target_role in await self.registry.roles(room_id):
             await self.send_personal_message({"type": "peer-joined", "role": role}, room_id, target_role)
         return True
 
-    def disconnect(self, room_id: str, role: str):
+    def disconnect(self, room_id: str, role: str, websocket: Optional[WebSocket] = None) -> bool:
+        """Drop the peer. With `websocket`, only if it is still the socket registered for that role
+        (a reaped peer may already have rejoined). True if something was removed."""
         role = role.lower().strip()
-        if room_id in self.rooms and role in self.rooms[room_id]:
-            del self.rooms[room_id][role]
-            logger.info(f"Disconnected: {role} from room {room_id}")
-            if not self.rooms[room_id]:
-                del self.rooms[room_id]
-                logger.info(f"Room {room_id} deleted because it is empty.")
-
-    async def send_personal_message(self, message: dict, room_id: str, target_role: str):
-        target_role = target_role.lower().strip()
-        if room_id in self.rooms and target_role in self.rooms[room_id]:
-            try:
-                websocket = self.rooms[room_id][target_role]
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error sending to {target_role}: {e}")
+        current = self.rooms.get(room_id, {}).get(role)
+        if current is None or (websocket is not None and current is not websocket): return False
+        outbox = self.outboxes.pop(current, None)
+        if outbox: outbox.close()
+        self.last_seen.pop(current, None)
+        del self.rooms[room_id][role]
+        self.registry.leave(room_id, role)
+        logger.info(f"Disconnected: {role} from room {room_id}")
+        self._notify("left", room_id, role)
+        if not self.rooms[room_id]:
+            del self.rooms[room_id]
+            logger.info(f"Room {room_id} deleted because it is empty.")
+        return True
+
+    def touch(self, websocket: WebSocket) -> bool:
+        """Record inbound traffic (any frame counts as a pong). False if the socket is no longer registered (reaped)."""
+        if websocket not in self.last_seen: return False
+        self.last_seen[websocket] = time.monotonic()
+        return True
+
+    async def sweep(self, interval: float, idle_timeout: float, on_reap: Optional[Callable[[str, str], Awaitable[None]]] = None) -> int:
+        """Ping sockets idle for `interval`, reap the ones silent for `idle_timeout`. Returns the number reaped."""
+        now, reaped = time.monotonic(), 0
+        for room_id, peers in list(self.rooms.items()):
+            for role, websocket in list(peers.items()):
+                idle = now - self.last_seen.get(websocket, now)
+                if idle < interval: continue
+                if idle < idle_timeout:
+                    self._enqueue(room_id, role, PING_FRAME)
+                    continue
+                if not self.disconnect(room_id, role, websocket): continue
+                reaped += 1
+                self.reaped[role] = self.reaped.get(role, 0) + 1
+                metrics.ws_reaped.inc((role,))
+                logger.warning(f"Reaped {role} in room {room_id}: silent for {idle:.0f}s")
+                asyncio.create_task(self._close_quietly(websocket))
+                if on_reap:
+                    try: await on_reap(room_id, role)
+                    except Exception as e: logger.error(f"Reap cleanup failed for room {room_id}: {e}")
+        return reaped
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try: await asyncio.wait_for(websocket.close(code=4008, reason="Heartbeat timeout"), 5)
+        except Exception: pass
+
+    async def heartbeat_forever(self, interval: float, idle_timeout: float, on_reap: Optional[Callable[[str, str], Awaitable[None]]] = None):
+        while True:
+            await asyncio.sleep(interval)
+            try: await self.sweep(interval, idle_timeout, on_reap)
+            except Exception as e: logger.error(f"Heartbeat sweep failed: {e}")
+
+    async def is_online(self, room_id: str, role: str) -> bool:
+        return role in await self.registry.roles(room_id)
+
+    async def online_rooms(self, room_ids: Iterable[str], role: str) -> Set[str]:
+        """Subset of room_ids where `role` is connected on any worker."""
+        return await self.registry.online(room_ids, role)
+
+    def _enqueue(self, room_id: str, target_role: str, data: str) -> bool:
+        """Queue a frame for a local socket. False if the peer is not held by this worker."""
+        websocket = self.rooms.get(room_id, {}).get(target_role)
+        outbox = self.outboxes.get(websocket)
+        if outbox is None: return False
+        if not outbox.put(data):
+            # Peer is hopelessly behind; cut it loose instead of buffering forever
+            logger.warning(f"Outbound queue full for {target_role} in room {room_id}; closing")
+            asyncio.create_task(websocket.close(code=1013, reason="Too slow"))
+        return True
+
+    async def _deliver(self, room_id: str, target_role: str, data: str):
+        self._enqueue(room_id, target_role, data)
+
+    async def _send(self, room_id: str, target_role: str, data: str):
+        if not self._enqueue(room_id, target_role, data):
+            await self.registry.publish(room_id, target_role, data)
+
+    async def send_personal_message(self, message: Union[dict, str], room_id: str, target_role: str):
+        """`message` may be a dict or an already-serialized frame, which is forwarded untouched."""
+        data = message if isinstance(message, str) else codec.dumps(message)
+        await self._send(room_id, target_role.lower().strip(), data)
 
-    async def broadcast(self, room_id: str, message: dict, exclude_role: str = None):
-        if room_id in self.rooms:
-            for role, connection in list(self.rooms[room_id].items()):
-                if role != exclude_role:
-                    await connection.send_text(json.dumps(message))
+    async def broadcast(self, room_id: str, message: Union[dict, str], exclude_role: str = None):
+        data = message if isinstance(message, str) else codec.dumps(message)
+        targets = [role for role in await self.registry.roles(room_id) if role != exclude_role]
+        await asyncio.gather(*(self._send(room_id, role, data) for role in targets))
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(create_registry(settings.ROOM_REGISTRY, settings.ROOM_REGISTRY_SOCKET), settings.WS_OUTBOUND_QUEUE, settings.MAX_ACTIVE_ROOMS)
@@ -0,0 +1,36 @@
+import asyncio
+import time
+from typing import List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples: return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def summarize(name: str, samples_ms: List[float]) -> str:
+    return (f"{name}: n={len(samples_ms)} p50={percentile(samples_ms, 50):.2f}ms "
+            f"p99={percentile(samples_ms, 99):.2f}ms max={max(samples_ms, default=0.0):.2f}ms")
+
+
+async def relay_probe(stop: asyncio.Event, interval: float = 0.005) -> List[float]:
+    """Simulates a signaling relay: one task hands a frame to another through a queue
+    and we record how long the hop takes. Any blocking call on the loop shows up here."""
+    inbox: asyncio.Queue = asyncio.Queue()
+    samples: List[float] = []
+
+    async def peer():
+        while True:
+            sent_at = await inbox.get()
+            if sent_at is None: return
+            samples.append((time.perf_counter() - sent_at) * 1000)
+
+    receiver = asyncio.create_task(peer())
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        inbox.put_nowait(time.perf_counter())
+    inbox.put_nowait(None)
+    await receiver
+    return samples
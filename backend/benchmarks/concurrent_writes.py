@@ -0,0 +1,87 @@
+"""Concurrent session writes against SQLite: default rollback journal vs WAL + busy_timeout.
+
+    cd backend && python -m benchmarks.concurrent_writes --writers 20 --readers 20 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core import models
+from app.core.database import tune_sqlite
+from benchmarks.common import summarize
+
+
+def seed(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(models.KYCSession.__table__.insert(), [{"room_id": f"bench-{i}", "customer_id": i, "service_type": "KYC", "status": "requested"} for i in range(rows)])
+    engine.dispose()
+
+
+async def run(mode: str, path: str, writers: int, readers: int, seconds: float, rows: int):
+    if mode == "default":
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 0})
+    else:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 5})
+        tune_sqlite(engine.sync_engine, wal=True, busy_timeout_ms=5000)
+    Session = async_sessionmaker(engine, class_=AsyncSession)
+    stop = asyncio.Event()
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    write_ms = []
+
+    async def writer(n: int):
+        i = n
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                async with Session() as db:
+                    await db.execute(update(models.KYCSession).where(models.KYCSession.room_id == f"bench-{i % rows}").values(status="active" if i % 2 else "requested"))
+                    await db.commit()
+                counts["writes"] += 1
+                write_ms.append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                counts["locked"] += 1
+            i += writers
+
+    async def reader():
+        while not stop.is_set():
+            try:
+                async with Session() as db:
+                    (await db.scalars(select(models.KYCSession).filter(models.KYCSession.status == "requested").limit(50))).all()
+                counts["reads"] += 1
+            except OperationalError:
+                counts["locked"] += 1
+
+    tasks = [asyncio.create_task(writer(n)) for n in range(writers)] + [asyncio.create_task(reader()) for _ in range(readers)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    await engine.dispose()
+    print(f"[{mode}] {counts['writes'] / seconds:.0f} writes/s, {counts['reads'] / seconds:.0f} reads/s, "
+          f"{counts['locked']} 'database is locked' errors | " + summarize("commit", write_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    for mode in ("default", "wal"):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            seed(path, args.rows)
+            asyncio.run(run(mode, path, args.writers, args.readers, args.seconds, args.rows))
+
+
+if __name__ == "__main__":
+    main()
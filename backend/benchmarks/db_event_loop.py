@@ -0,0 +1,72 @@
+"""Signaling latency under concurrent REST-style DB traffic, sync vs async sessions.
+
+    cd backend && python -m benchmarks.db_event_loop --workers 50 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import models
+from benchmarks.common import relay_probe, summarize
+
+
+def seed(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([models.KYCSession(room_id=f"bench-{i}", customer_id=i, service_type="KYC") for i in range(rows)])
+        db.commit()
+    engine.dispose()
+
+
+async def run(mode: str, path: str, workers: int, seconds: float):
+    stop = asyncio.Event()
+    stmt = select(models.KYCSession).filter(models.KYCSession.status == "requested")
+    queries = 0
+
+    if mode == "sync":
+        # Old behaviour: the handler is async but the session is blocking
+        SessionLocal = sessionmaker(bind=create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+        async def handler():
+            with SessionLocal() as db: return db.scalars(stmt).all()
+    else:
+        AsyncSessionLocal = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"), class_=AsyncSession)
+        async def handler():
+            async with AsyncSessionLocal() as db: return (await db.scalars(stmt)).all()
+
+    async def client():
+        nonlocal queries
+        while not stop.is_set():
+            await handler(); queries += 1
+            await asyncio.sleep(0)
+
+    probe = asyncio.create_task(relay_probe(stop))
+    clients = [asyncio.create_task(client()) for _ in range(workers)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*clients)
+    samples = await probe
+    print(f"[{mode}] {queries / seconds:.0f} req/s | " + summarize("relay latency", samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.rows)
+        for mode in ("sync", "async"):
+            asyncio.run(run(mode, path, args.workers, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""End-to-end load test: N customers and M agents run the whole KYC flow against a live server.
+
+Customer: OTP request/verify -> set MPIN -> apply -> join /ws/{room}/{client} -> answer + ICE -> wait for close.
+Agent:    register -> set MPIN -> approve -> accept -> join -> offer + ICE -> capture upload -> service decision.
+
+    cd backend && python -m benchmarks.kyc_flow --customers 100 --agents 10
+
+By default a uvicorn server is spawned on localhost with a throwaway database and capture directory,
+and its RSS (summed over worker processes) is sampled. Use --url (plus --database-url, to read the OTPs the server only logs) to
+target a server you started yourself with OTP_STORE=database. Needs httpx and websockets.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import models
+from app.core.database import async_url
+from benchmarks.common import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def png(size: int) -> bytes:
+    """A valid grayscale PNG, so the capture transcoder has real work to do."""
+    raw = b"".join(b"\x00" + bytes(random.getrandbits(8) for _ in range(size)) for _ in range(size))
+    chunk = lambda tag, data: struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0)) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def rss_kib(pid: int, field: str = "VmRSS") -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"): return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and its descendants (uvicorn --workers N: the supervisor plus its worker processes)."""
+    parents: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit(): continue
+        try:
+            with open(f"/proc/{entry}/stat") as f: ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError): continue
+        parents.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop(); tree.append(p); todo += parents.get(p, [])
+    return tree
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def timed(self, step: str, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            self.errors[step] += 1
+            raise
+        finally:
+            self.samples[step].append((time.perf_counter() - started) * 1000)
+
+    def report(self):
+        print(f"{'step':<16}{'n':>7}{'err':>6}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for step, values in self.samples.items():
+            print(f"{step:<16}{len(values):>7}{self.errors[step]:>6}{percentile(values, 50):>10.1f}{percentile(values, 99):>10.1f}{max(values):>10.1f}")
+
+
+class Flow:
+    def __init__(self, args, http: httpx.AsyncClient, otp_engine, rec: Recorder):
+        self.args = args
+        self.http = http
+        self.otp_engine = otp_engine
+        self.rec = rec
+        self.ws_base = args.url.replace("http", "ws", 1)
+        self.run_id = random.randint(10, 99)
+        self.rooms: asyncio.Queue = asyncio.Queue()
+        self.capture = png(args.capture_px)
+        self.completed = 0
+
+    async def post(self, step: str, path: str, token: Optional[str] = None, **kwargs) -> dict:
+        headers = kwargs.pop("headers", {})
+        if token: headers["Authorization"] = f"Bearer {token}"
+        r = await self.rec.timed(step, self.http.post(path, headers=headers, **kwargs))
+        if r.status_code >= 400: self.rec.errors[step] += 1; raise RuntimeError(f"{step}: {r.status_code} {r.text[:200]}")
+        return r.json()
+
+    async def read_otp(self, identifier: str) -> str:
+        async with self.otp_engine.connect() as conn:
+            return await conn.scalar(select(models.OTPTracker.otp_code).filter(models.OTPTracker.identifier == identifier).order_by(models.OTPTracker.expires_at.desc()))
+
+    async def ice(self, ws, count: int):
+        for i in range(count):
+            await ws.send(json.dumps({"type": "ice-candidate", "candidate": {"candidate": f"candidate:{i} 1 udp 2122260223 10.0.0.{i % 250} {50000 + i} typ host", "sdpMid": "0", "sdpMLineIndex": 0}}))
+
+    async def expect(self, ws, want: str, ice: int) -> None:
+        """Read until a `want` frame and `ice` candidates have arrived (batches flattened)."""
+        seen_want, seen_ice = want is None, 0
+        while not (seen_want and seen_ice >= ice):
+            msg = json.loads(await asyncio.wait_for(ws.recv(), self.args.timeout))
+            for frame in msg.get("frames", [msg]) if msg.get("type") == "batch" else [msg]:
+                kind = frame.get("type")
+                if kind == want: seen_want = True
+                elif kind == "ice-candidate": seen_ice += 1
+                elif kind == "ice-candidates": seen_ice += len(frame.get("candidates", []))
+
+    async def customer(self, i: int):
+        mobile = f"9{self.run_id}{i:07d}"
+        await self.post("otp_request", "/api/verify/mobile/request", json={"mobile_number": mobile})
+        code = await self.rec.timed("otp_lookup", self.read_otp(mobile))
+        token = (await self.post("otp_verify", "/api/verify/mobile/verify", json={"mobile_number": mobile, "otp": code}))["access_token"]
+        await self.post("set_mpin", "/api/auth/set-mpin", token, json={"mpin": "1234"})
+        room_id = (await self.post("apply", "/api/services/apply/account", token, json={"account_type": "Savings"}))["room_id"]
+        async with await self.rec.timed("ws_connect", websockets.connect(f"{self.ws_base}/ws/{room_id}/c{i}?token={token}")) as ws:
+            await self.rooms.put(room_id)
+            await self.rec.timed("recv_offer", self.expect(ws, "offer", 0))
+            await ws.send(json.dumps({"type": "answer", "answer": {"type": "answer", "sdp": "v=0"}}))
+            await self.ice(ws, self.args.ice)
+            await self.rec.timed("recv_ice", self.expect(ws, None, self.args.ice))
+            await self.rec.timed("wait_close", self.expect(ws, "close-session", 0))
+
+    async def agent(self, j: int):
+        digits = f"{self.run_id}{j:08d}"
+        reg = await self.post("agent_register", "/api/auth/agent/register", json={
+            "username": f"bench-{digits}", "password": "bench", "mobile_number": f"8{digits[-9:]}",
+            "aadhar_number": f"7{digits:0>11}", "pan_number": f"B{digits[-9:]:0>9}"})
+        token = reg["access_token"]
+        await self.post("set_mpin", "/api/auth/set-mpin", token, json={"mpin": "1234"})
+        await self.post("approve", "/api/admin/approve-agent", json={"agent_id": reg["user_id"], "approve": True})
+        while True:
+            room_id = await self.rooms.get()
+            if room_id is None: return
+            try:
+                await self.post("accept", f"/api/kyc/accept/{room_id}", token)
+                async with await self.rec.timed("ws_connect", websockets.connect(f"{self.ws_base}/ws/{room_id}/a{j}?token={token}")) as ws:
+                    await ws.send(json.dumps({"type": "offer", "offer": {"type": "offer", "sdp": "v=0"}}))
+                    await self.rec.timed("recv_answer", self.expect(ws, "answer", self.args.ice))
+                    await self.ice(ws, self.args.ice)
+                    await self.post("capture", "/api/session/capture/upload", token, params={"room_id": room_id, "label": "face"},
+                                    content=self.capture, headers={"Content-Type": "image/png"})
+                    await self.post("decision", "/api/agent/service/decision", json={"room_id": room_id, "status": "approved"})
+                self.completed += 1
+            except Exception as e:
+                print(f"agent {j}: room {room_id} failed: {e}", file=sys.stderr)
+
+    async def run(self):
+        gate = asyncio.Semaphore(self.args.concurrency)
+        async def customer(i):
+            async with gate:
+                try: await self.customer(i)
+                except Exception as e: print(f"customer {i} failed: {e}", file=sys.stderr)
+        agents = [asyncio.create_task(self.agent(j)) for j in range(self.args.agents)]
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        await asyncio.gather(*(customer(i) for i in range(self.args.customers)))
+        elapsed = time.perf_counter() - started
+        for _ in agents: await self.rooms.put(None)
+        await asyncio.gather(*agents, return_exceptions=True)
+        return elapsed
+
+
+async def sample_rss(pid: int, stop: asyncio.Event, peaks: List[int]):
+    """Total RSS of the server process and all its workers."""
+    while not stop.is_set():
+        kib = sum(rss_kib(p) or 0 for p in process_tree(pid))
+        if kib: peaks.append(kib)
+        await asyncio.sleep(0.2)
+
+
+async def main_async(args, server: Optional[subprocess.Popen]):
+    rec = Recorder()
+    otp_engine = create_async_engine(async_url(args.database_url))
+    limits = httpx.Limits(max_connections=args.concurrency + args.agents * 2)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as http:
+        for _ in range(100):
+            try:
+                if (await http.get("/api/signaling/stats")).status_code == 200: break
+            except httpx.TransportError: pass
+            await asyncio.sleep(0.1)
+        stop, rss = asyncio.Event(), []
+        sampler = asyncio.create_task(sample_rss(server.pid, stop, rss)) if server else None
+        flow = Flow(args, http, otp_engine, rec)
+        elapsed = await flow.run()
+        stop.set()
+        if sampler: await sampler
+        metrics = (await http.get("/metrics")).text if args.metrics else ""
+    await otp_engine.dispose()
+
+    rec.report()
+    print(f"\n{flow.completed}/{args.customers} flows completed in {elapsed:.1f}s ({flow.completed / elapsed:.2f} flows/s, "
+          f"{sum(len(v) for v in rec.samples.values()) / elapsed:.0f} timed ops/s)")
+    if rss: print(f"server RSS (all processes): start {rss[0] / 1024:.1f} MiB, peak {max(rss) / 1024:.1f} MiB, end {rss[-1] / 1024:.1f} MiB")
+    print(f"client peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    if metrics: print("\n" + "\n".join(l for l in metrics.splitlines() if l.startswith(("kyc_rooms", "kyc_ws_peers", "kyc_db_connections", "kyc_ws_outbox_dropped"))))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=50, help="customers in flight at once")
+    parser.add_argument("--ice", type=int, default=8, help="ICE candidates sent by each side")
+    parser.add_argument("--capture-px", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--url", help="existing server, e.g. http://127.0.0.1:8000 (default: spawn one)")
+    parser.add_argument("--database-url", help="that server's DATABASE_URL, used to read OTPs")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned server")
+    parser.add_argument("--metrics", action="store_true", help="print a few /metrics gauges at the end")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.database_url: parser.error("--url needs --database-url to read OTPs")
+        asyncio.run(main_async(args, None))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        args.url = f"http://127.0.0.1:{port}"
+        args.database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        env = dict(os.environ, DATABASE_URL=args.database_url, OTP_STORE="database",
+                   CAPTURE_STORAGE_DIR=os.path.join(tmp, "captures"), JOURNAL_DIR=os.path.join(tmp, "journal"), ROOM_REGISTRY="local" if args.workers > 1 else "memory",
+                   ROOM_REGISTRY_SOCKET=os.path.join(tmp, "rooms.sock"),
+                   # Every simulated client is 127.0.0.1: per-IP limits would throttle the whole run as one client
+                   RATE_LIMIT_IP_PER_MIN="0", RATE_LIMIT_WS_PER_MIN="0")
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                                   "--workers", str(args.workers), "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+        try:
+            asyncio.run(main_async(args, server))
+        finally:
+            server.terminate()
+            server.wait(10)
+
+
+if __name__ == "__main__":
+    main()
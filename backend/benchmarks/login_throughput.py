@@ -0,0 +1,49 @@
+"""Login (bcrypt verify) throughput against p99 signaling relay latency, inline vs worker pool.
+
+    cd backend && python -m benchmarks.login_throughput --logins 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+from app.auth.hashing import HashingPool, pwd_context
+from benchmarks.common import relay_probe, summarize
+
+
+async def run(mode: str, hashed: str, logins: int, concurrency: int, workers: int, kind: str):
+    pool = HashingPool(workers, kind) if mode == "pool" else None
+    stop = asyncio.Event()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with gate:
+            if pool: await pool.verify("1234", hashed)
+            else: pwd_context.verify("1234", hashed)
+
+    probe = asyncio.create_task(relay_probe(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    samples = await probe
+    print(f"[{mode}] {logins / elapsed:.1f} logins/s | " + summarize("relay latency", samples))
+    if pool:
+        print(f"        pool stats: {pool.stats()}")
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--kind", choices=["thread", "process"], default="thread")
+    args = parser.parse_args()
+
+    hashed = pwd_context.hash("1234")
+    for mode in ("inline", "pool"):
+        asyncio.run(run(mode, hashed, args.logins, args.concurrency, args.workers, args.kind))
+
+
+if __name__ == "__main__":
+    main()
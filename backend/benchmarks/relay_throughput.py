@@ -0,0 +1,77 @@
+"""ICE-candidate relay throughput through ConnectionManager: legacy parse/re-serialize vs fast path.
+
+    cd backend && python -m benchmarks.relay_throughput --frames 50000 --slow-ms 0
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.rooms.registry import InMemoryRegistry
+from app.signaling import codec
+from app.websocket.connection_manager import ConnectionManager
+
+FRAME = json.dumps({"type": "ice-candidate", "candidate": {
+    "candidate": "candidate:842163049 1 udp 1677729535 203.0.113.7 54321 typ srflx raddr 10.0.0.5 rport 54321 generation 0 ufrag abcd network-cost 999",
+    "sdpMid": "0", "sdpMLineIndex": 0, "usernameFragment": "abcd"}})
+
+
+class FakeSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self): pass
+    async def close(self, code: int = 1000, reason: str = ""): pass
+
+    async def send_text(self, data: str):
+        if self.delay: await asyncio.sleep(self.delay)
+        self.received += 1
+
+
+async def legacy_relay(peer: FakeSocket, frames: int):
+    # What ws_end did before: full parse, re-serialize, await the send inline
+    for _ in range(frames):
+        m = json.loads(FRAME)
+        if m.get("type") in ["offer", "answer", "ice-candidate", "media-status", "close-session"]:
+            await peer.send_text(json.dumps(m))
+
+
+async def fast_relay(manager: ConnectionManager, frames: int):
+    for _ in range(frames):
+        if codec.peek_type(FRAME) == "ice-candidate":
+            await manager.send_personal_message(FRAME, "bench", "agent")
+
+
+async def run(frames: int, slow_ms: float):
+    peer = FakeSocket(slow_ms / 1000)
+    started = time.perf_counter()
+    await legacy_relay(peer, frames)
+    legacy = time.perf_counter() - started
+
+    manager = ConnectionManager(InMemoryRegistry(), outbound_queue=frames + 1)
+    await manager.start()
+    await manager.connect(FakeSocket(), "bench", "c", "customer")
+    agent = FakeSocket(slow_ms / 1000)
+    await manager.connect(agent, "bench", "a", "agent")
+    started = time.perf_counter()
+    await fast_relay(manager, frames)
+    sender = time.perf_counter() - started
+    while agent.received < frames: await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - started
+
+    print(f"codec={codec.BACKEND} frames={frames} slow_peer={slow_ms}ms")
+    print(f"  legacy : {frames / legacy:,.0f} frames/s (sender blocked for {legacy * 1000:.1f}ms)")
+    print(f"  fast   : {frames / sender:,.0f} frames/s at the sender, {frames / delivered:,.0f} frames/s delivered")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=50000)
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="artificial per-send delay of the receiving peer")
+    args = parser.parse_args()
+    asyncio.run(run(args.frames, args.slow_ms))
+
+
+if __name__ == "__main__":
+    main()
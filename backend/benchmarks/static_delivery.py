@@ -0,0 +1,49 @@
+"""Bytes on the wire to load the UI, plain StaticFiles vs fingerprinted + precompressed assets.
+
+    cd backend && python -m benchmarks.static_delivery --kbps 400 --rtt-ms 300
+"""
+import argparse
+import os
+
+from app.core.assets import IMMUTABLE, REVALIDATE, StaticAssets
+
+FRONTEND = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "frontend")
+
+
+def page_load(assets: StaticAssets, accept: str, cached: dict):
+    """Fetch index.html and what it references; returns (requests, bytes). `cached` maps path -> ETag."""
+    requests, transferred = 0, 0
+    html = assets.files["index.html"].body.decode()
+    paths = ["index.html"] + [p for p, a in assets.files.items() if a.cache_control == IMMUTABLE and p in html]
+    for path in paths:
+        if path in cached and assets.files[path].cache_control == IMMUTABLE: continue  # immutable: no request at all
+        headers = {"accept-encoding": accept}
+        if path in cached: headers["if-none-match"] = cached[path]
+        r = assets.response(path, headers)
+        requests += 1
+        transferred += len(r.body) + 200  # rough response header size
+        cached[path] = r.headers["ETag"]
+    return requests, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kbps", type=float, default=400, help="link speed, e.g. 400 for a poor 3G connection")
+    parser.add_argument("--rtt-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    assets = StaticAssets(FRONTEND)
+    plain = sum(len(a.body) for p, a in assets.files.items() if a.cache_control == REVALIDATE and p != "index.html") + len(assets.files["index.html"].body)
+    estimate = lambda requests, n: requests * args.rtt_ms + n * 8 / args.kbps
+    # StaticFiles: uncompressed, revalidated with If-None-Match on every visit (3 requests, 304s on repeat)
+    print(f"[StaticFiles] first visit: 3 req, {plain + 600} B, ~{estimate(3, plain + 600):.0f} ms | repeat: 3 req, ~{estimate(3, 600):.0f} ms")
+    for accept in ("gzip", "br, gzip"):
+        cached = {}
+        first = page_load(assets, accept, cached)
+        repeat = page_load(assets, accept, cached)
+        print(f"[assets {accept:>8}] first visit: {first[0]} req, {first[1]} B, ~{estimate(*first):.0f} ms | "
+              f"repeat: {repeat[0]} req, {repeat[1]} B, ~{estimate(*repeat):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Concurrent WebSocket calls vs a small connection pool: session held for the whole call vs scoped lookups.
+
+    cd backend && python -m benchmarks.ws_sessions --calls 300 --pool-size 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core import models
+from app.core.database import PoolStats
+
+
+def seed(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(models.KYCSession.__table__.insert(), [{"room_id": f"bench-{i}", "customer_id": i, "service_type": "KYC", "status": "requested"} for i in range(rows)])
+    engine.dispose()
+
+
+async def run(mode: str, path: str, calls: int, pool_size: int, call_seconds: float):
+    class BenchSession(Session): pass
+    stats = PoolStats()
+    stats.track_sessions(BenchSession)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool, pool_size=pool_size, max_overflow=0, pool_timeout=2)
+    stats.attach(engine.sync_engine)
+    Session_ = async_sessionmaker(engine, class_=AsyncSession, sync_session_class=BenchSession)
+    stmt = lambda i: select(models.KYCSession).filter(models.KYCSession.room_id == f"bench-{i}")
+    outcome = {"ok": 0, "pool_timeout": 0}
+
+    async def call(i: int):
+        try:
+            if mode == "held":
+                # Old ws_end: one session opened at connect and kept until the socket closes
+                async with Session_() as db:
+                    await db.scalar(stmt(i))
+                    await asyncio.sleep(call_seconds)
+                    await db.scalar(stmt(i))
+            else:
+                async with Session_() as db: await db.scalar(stmt(i))
+                await asyncio.sleep(call_seconds)  # receive loop runs without a connection
+                async with Session_() as db: await db.scalar(stmt(i))
+            outcome["ok"] += 1
+        except PoolTimeout:
+            outcome["pool_timeout"] += 1
+
+    await asyncio.gather(*(call(i) for i in range(calls)))
+    await engine.dispose()
+    snap = stats.snapshot()
+    print(f"[{mode}] {outcome['ok']}/{calls} calls ok, {outcome['pool_timeout']} pool timeouts | "
+          f"peak checked out {snap['peak_checked_out']}, peak sessions {snap['peak_sessions_open']}, "
+          f"checkout wait p95={snap['checkout_wait_ms']['p95']}ms max={snap['checkout_wait_ms']['max']}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--call-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.calls)
+        for mode in ("held", "scoped"):
+            asyncio.run(run(mode, path, args.calls, args.pool_size, args.call_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+import pytest
+
+# Settings are read at import: point the app at a throwaway database and directories before any test imports it
+RUNTIME = tempfile.mkdtemp(prefix="kyc-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{RUNTIME}/test.db",
+    "CAPTURE_STORAGE_DIR": os.path.join(RUNTIME, "captures"),
+    "SCHEMA_LOCK_FILE": os.path.join(RUNTIME, "schema.lock"),
+    "JOURNAL": "off",
+    "ROOM_REGISTRY": "memory",
+})
+
+@pytest.fixture
+def database():
+    """Empty tables in the app's database, for code that opens its own AsyncSessionLocal sessions."""
+    from app.core import models
+    from app.core.database import engine
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from app.signaling import codec
+
+@pytest.mark.parametrize("frame, kind", [
+    ('{"type":"ice-candidate","candidate":{"candidate":"a"}}', "ice-candidate"),  # fast path
+    ('{"type":"chat"}', "chat"),
+    ('{"type":"sdp","type2":"x"}', "sdp"),
+    ('{"candidate":1,"type":"offer"}', "offer"),  # key not first
+    ('{ "type" : "answer" }', "answer"),  # not JSON.stringify spacing
+    ('{"type":"a\\"b"}', 'a"b'),  # escaped quote in the value
+    ('{"type":"caf\\u00e9"}', "café"),
+    ('{"type":"ä"}', "ä"),
+    ('{"payload":{"type":"inner"}}', None),  # only the top level counts
+    ('["type"]', None),
+    ('"type"', None),
+    ('{"type":null}', None),
+])
+def test_peek_type(frame, kind):
+    assert codec.peek_type(frame) == kind
+    assert kind == (json.loads(frame).get("type") if isinstance(json.loads(frame), dict) else None)
+
+@pytest.mark.parametrize("frame", ["", "not json", '{"type":', '{"x":"type"'])
+def test_peek_type_rejects_malformed_frames(frame):
+    with pytest.raises(ValueError): codec.peek_type(frame)
@@ -0,0 +1,124 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.core import models
+from app.core.database import AsyncSessionLocal, async_engine
+from app.rooms import dispatch
+from app.rooms.registry import InMemoryRegistry
+from app.websocket.connection_manager import ConnectionManager
+
+def run(coro):
+    async def main():
+        try: return await coro
+        finally: await async_engine.dispose()  # aiosqlite connections must not outlive this loop
+    return asyncio.run(main())
+
+async def add_session(room_id: str, service_type: str = "KYC"):
+    async with AsyncSessionLocal() as db:
+        db.add(models.KYCSession(room_id=room_id, service_type=service_type, status="requested"))
+        await db.commit()
+
+async def load(room_id: str) -> models.KYCSession:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(models.KYCSession).filter(models.KYCSession.room_id == room_id))
+
+def online_dispatcher(*room_ids: str) -> dispatch.Dispatcher:
+    registry = InMemoryRegistry()
+    for room_id in room_ids: registry.rooms[room_id] = {"customer"}
+    return dispatch.Dispatcher(ConnectionManager(registry), ["KYC"])
+
+def test_claim_is_won_once(database):
+    async def scenario():
+        await add_session("r1")
+        async def attempt(agent_id):
+            async with AsyncSessionLocal() as db: return await dispatch.claim(db, "r1", agent_id)
+        return await asyncio.gather(*(attempt(agent_id) for agent_id in (1, 2, 3))), await load("r1")
+    results, s = run(scenario())
+    winners = [r for r in results if r is not None]
+    assert len(winners) == 1
+    assert (s.status, s.agent_id) == ("active", winners[0].agent_id)
+
+def test_release_only_undoes_own_claim(database):
+    async def scenario():
+        await add_session("r1")
+        async with AsyncSessionLocal() as db:
+            await dispatch.claim(db, "r1", 1)
+            await dispatch.release(db, "r1", 2)
+            other = (await load("r1")).status
+            await dispatch.release(db, "r1", 1)
+        return other, await load("r1")
+    other, s = run(scenario())
+    assert other == "active"
+    assert (s.status, s.agent_id, s.accepted_at) == ("requested", None, None)
+
+def test_accept_twice_is_409(database):
+    from app import main
+    run(add_session("r1"))
+    client = TestClient(main.app)
+    try:
+        main.app.dependency_overrides[main.get_user] = lambda: models.User(id=1, role="agent")
+        assert client.post("/api/kyc/accept/r1").status_code == 200
+        main.app.dependency_overrides[main.get_user] = lambda: models.User(id=2, role="agent")
+        assert client.post("/api/kyc/accept/r1").status_code == 409
+        assert client.post("/api/kyc/accept/missing").status_code == 404
+    finally:
+        main.app.dependency_overrides.clear()
+        run(async_engine.dispose())
+
+def test_next_for_times_out_and_leaves_the_line(database):
+    async def scenario():
+        d = online_dispatcher()
+        return await d.next_for(1, 0.05), d.waiting
+    s, waiting = run(scenario())
+    assert s is None and not waiting
+
+def test_next_for_leaves_when_agent_is_gone(database):
+    async def scenario():
+        d = online_dispatcher()
+        started = asyncio.get_running_loop().time()
+        async def gone(): return True
+        s = await d.next_for(1, 30, gone, check_every=0.01)
+        return s, d.waiting, asyncio.get_running_loop().time() - started
+    s, waiting, elapsed = run(scenario())
+    assert s is None and not waiting and elapsed < 1
+
+def test_next_for_gets_the_oldest_online_customer(database):
+    async def scenario():
+        await add_session("offline"); await add_session("r1"); await add_session("r2")
+        d = online_dispatcher("r1", "r2")
+        runner = asyncio.create_task(d.run())
+        try: return await d.next_for(7, 5)
+        finally: runner.cancel()
+    s = run(scenario())
+    assert (s.room_id, s.agent_id, s.status) == ("r1", 7, "active")
+
+def test_next_for_returns_claim_landing_while_it_gives_up(database):
+    # The dispatcher claims while next_for is awaiting is_gone() on its way out: the claim must be handed over, not lost
+    async def scenario():
+        await add_session("r1")
+        d = online_dispatcher("r1")
+        async def gone():
+            await d._match()
+            return True
+        return await d.next_for(1, 30, gone, check_every=0.01)
+    s = run(scenario())
+    assert s is not None and (s.room_id, s.status) == ("r1", "active")
+
+def test_claim_for_cancelled_wait_is_released(database, monkeypatch):
+    real_claim = dispatch.claim
+    async def scenario():
+        await add_session("r1")
+        d = online_dispatcher("r1")
+        entry = [1, asyncio.get_running_loop().create_future()]
+        d.waiting.append(entry)
+        async def claim_then_agent_leaves(db, room_id, agent_id):
+            s = await real_claim(db, room_id, agent_id)
+            entry[1].cancel()  # next_for gave up while the UPDATE was in flight
+            return s
+        monkeypatch.setattr(dispatch, "claim", claim_then_agent_leaves)
+        await d._match()
+        return await load("r1")
+    s = run(scenario())
+    assert (s.status, s.agent_id) == ("requested", None)
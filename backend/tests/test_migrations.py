@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from app.core import migrations, models
+from app.core.migrations import prepare, upgrade
+
+# Tables as the first release created them (before updated_at, blob store columns, token expiry...)
+BASELINE = [
+    """CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR, hashed_password VARCHAR, hashed_mpin VARCHAR, is_mpin_set BOOLEAN,
+       mobile_number VARCHAR, is_mobile_verified BOOLEAN, aadhar_number VARCHAR, is_aadhar_verified BOOLEAN, pan_number VARCHAR,
+       is_pan_verified BOOLEAN, video_kyc_status VARCHAR, is_admin_approved BOOLEAN, role VARCHAR, PRIMARY KEY (id),
+       UNIQUE (aadhar_number), UNIQUE (pan_number))""",
+    """CREATE TABLE kyc_sessions (id INTEGER NOT NULL, room_id VARCHAR, customer_id INTEGER, agent_id INTEGER, service_type VARCHAR,
+       status VARCHAR, requested_at DATETIME, PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES users (id),
+       FOREIGN KEY(agent_id) REFERENCES users (id))""",
+    "CREATE UNIQUE INDEX ix_kyc_sessions_room_id ON kyc_sessions (room_id)",
+    """CREATE TABLE captures (id INTEGER NOT NULL, session_id INTEGER, label VARCHAR, image_base64 TEXT, timestamp DATETIME,
+       PRIMARY KEY (id), FOREIGN KEY(session_id) REFERENCES kyc_sessions (id))""",
+    "CREATE TABLE token_blacklist (id INTEGER NOT NULL, token VARCHAR, blacklisted_at DATETIME, PRIMARY KEY (id))",
+    "CREATE UNIQUE INDEX ix_token_blacklist_token ON token_blacklist (token)",
+    "CREATE TABLE otps (id INTEGER NOT NULL, identifier VARCHAR, otp_code VARCHAR, expires_at DATETIME, PRIMARY KEY (id))",
+]
+
+def baseline_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    requested = datetime(2024, 1, 2, 3, 4, 5)
+    with engine.begin() as conn:
+        for ddl in BASELINE: conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO kyc_sessions (id, room_id, status, requested_at) VALUES (1, 'room-1', 'requested', :at)"), {"at": requested})
+        conn.execute(text("INSERT INTO captures (id, session_id, label, image_base64) VALUES (1, 1, 'face', 'aGk=')"))
+    return engine, requested
+
+def test_upgrade_adds_missing_columns_and_indexes(tmp_path):
+    engine, requested = baseline_engine(tmp_path)
+    models.Base.metadata.create_all(bind=engine)
+    changes = upgrade(engine, models.Base.metadata)
+
+    assert "captures.processed_at" in changes
+    assert "kyc_sessions.updated_at" in changes
+    assert "token_blacklist.expires_at" in changes
+    insp = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        assert {c.name for c in table.columns} <= {c["name"] for c in insp.get_columns(table.name)}
+        assert {i.name for i in table.indexes} <= {i["name"] for i in insp.get_indexes(table.name)}
+
+    with engine.connect() as conn:
+        # The startup queries that used to fail against an old database
+        assert conn.execute(text("SELECT id FROM captures WHERE processed_at IS NULL AND storage_path IS NULL")).all() == [(1,)]
+        assert conn.execute(text("SELECT count(*) FROM token_blacklist WHERE expires_at IS NULL")).scalar() == 0
+        updated_at = conn.execute(text("SELECT updated_at FROM kyc_sessions WHERE id = 1")).scalar()
+    assert updated_at == str(requested)  # backfilled, so existing sessions keep their place in the change feed
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine, _ = baseline_engine(tmp_path)
+    models.Base.metadata.create_all(bind=engine)
+    assert upgrade(engine, models.Base.metadata)
+    assert upgrade(engine, models.Base.metadata) == []
+
+def test_fresh_database_needs_no_upgrade(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    assert upgrade(engine, models.Base.metadata) == []
+
+def test_prepare_from_concurrent_workers(tmp_path):
+    # Every uvicorn worker runs prepare() at import; none of them may fail on DDL another one already ran
+    engine, _ = baseline_engine(tmp_path)
+    lock = str(tmp_path / "schema.lock")
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: prepare(create_engine(engine.url), models.Base.metadata, lock), range(4)))
+    assert sum(1 for changes in results if changes) == 1
+    assert upgrade(engine, models.Base.metadata) == []
+
+def test_prepare_retries_lost_ddl_race(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    calls = []
+    def upgrade_losing_once(engine, metadata):
+        calls.append(1)
+        if len(calls) == 1: raise OperationalError("ALTER TABLE", {}, Exception("duplicate column name: processed_at"))
+        return upgrade(engine, metadata)
+    monkeypatch.setattr(migrations, "upgrade", upgrade_losing_once)
+    assert prepare(engine, models.Base.metadata, str(tmp_path / "schema.lock")) == []
+    assert len(calls) == 2
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import timedelta
+
+from app.auth import otp
+from app.auth.otp import DatabaseOTPStore, MemoryOTPStore
+from app.core.database import AsyncSessionLocal, async_engine
+
+def run(coro):
+    async def main():
+        try: return await coro
+        finally: await async_engine.dispose()  # aiosqlite connections must not outlive this loop
+    return asyncio.run(main())
+
+def test_codes_are_six_digits():
+    assert all(len(code) == 6 and code.isdigit() for code in (otp.new_code() for _ in range(100)))
+
+def test_memory_store_verifies_only_the_latest_code(monkeypatch):
+    codes = iter(["111111", "222222"])
+    monkeypatch.setattr(otp, "new_code", lambda: next(codes))
+    async def scenario():
+        store = MemoryOTPStore(timedelta(minutes=10), max_size=10)
+        await store.issue(None, "9876543210"); await store.issue(None, "9876543210")
+        return [await store.verify(None, "9876543210", "111111"), await store.verify(None, "9876543210", "222222"),
+                await store.verify(None, "1111111111", "222222")]
+    assert run(scenario()) == [False, True, False]
+
+def test_memory_store_rejects_wrong_and_non_ascii_codes():
+    async def scenario():
+        store = MemoryOTPStore(timedelta(minutes=10), max_size=10)
+        await store.issue(None, "a")
+        return [await store.verify(None, "a", code) for code in ("000000", "ääääää", "")]
+    assert run(scenario()) == [False, False, False]
+
+def test_memory_store_expires_evicts_and_purges(monkeypatch):
+    async def scenario():
+        store = MemoryOTPStore(timedelta(seconds=60), max_size=2)
+        now = [1000.0]
+        monkeypatch.setattr(otp.time, "time", lambda: now[0])
+        code = await store.issue(None, "a")
+        await store.issue(None, "b"); await store.issue(None, "c")  # evicts a
+        evicted = await store.verify(None, "a", code)
+        now[0] += 61
+        expired = await store.verify(None, "b", "123456")
+        return evicted, expired, await store.purge(), len(store._codes)
+    assert run(scenario()) == (False, False, 2, 0)
+
+def test_database_store_round_trip(database):
+    async def scenario():
+        store = DatabaseOTPStore(timedelta(minutes=10))
+        async with AsyncSessionLocal() as db:
+            code = await store.issue(db, "123412341234")
+            results = [await store.verify(db, "123412341234", c) for c in ("ääääää", "x" * 6, code)]
+            await store.discard(db, "123412341234")
+            results.append(await store.verify(db, "123412341234", code))
+        return results
+    assert run(scenario()) == [False, False, True, False]
+
+def test_database_store_purges_expired(database):
+    async def scenario():
+        store = DatabaseOTPStore(timedelta(seconds=-1))
+        async with AsyncSessionLocal() as db:
+            code = await store.issue(db, "a")
+            expired = await store.verify(db, "a", code)
+        return expired, await store.purge()
+    assert run(scenario()) == (False, 1)
@@ -0,0 +1,68 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core import ratelimit
+from app.core.ratelimit import AdmissionGate, RateLimiter
+
+class Clock:
+    def __init__(self): self.now = 1000.0
+    def __call__(self): return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", c)
+    return c
+
+def test_burst_then_limited_until_refill(clock):
+    limiter = RateLimiter("otp", per_minute=6, burst=2)
+    assert limiter.hit("a") == 0 and limiter.hit("a") == 0
+    assert limiter.hit("a") == pytest.approx(10)  # one token per 10s
+    assert limiter.hit("b") == 0  # buckets are per key
+    clock.now += 10
+    assert limiter.hit("a") == 0
+    assert (limiter.allowed, limiter.limited) == (4, 1)
+
+def test_refill_is_capped_at_burst(clock):
+    limiter = RateLimiter("login", per_minute=60, burst=2)
+    limiter.hit("a")
+    clock.now += 3600
+    assert [limiter.hit("a") for _ in range(3)][-1] > 0
+
+def test_zero_rate_disables(clock):
+    limiter = RateLimiter("ws", per_minute=0)
+    assert all(limiter.hit("a") == 0 for _ in range(1000))
+
+def test_keys_are_an_lru(clock):
+    limiter = RateLimiter("ip", per_minute=1, burst=1, max_keys=2)
+    limiter.hit("a"); limiter.hit("b")
+    limiter.hit("a")  # a is limited, and now the most recently used
+    limiter.hit("c")  # evicts b
+    assert set(limiter._buckets) == {"a", "c"} and limiter.evicted == 1
+    assert limiter.hit("b") == 0  # an evicted key starts over with a full bucket
+
+def test_check_raises_429_with_retry_after(clock):
+    limiter = RateLimiter("otp", per_minute=2, burst=1)
+    limiter.check("a")
+    with pytest.raises(HTTPException) as e: limiter.check("a")
+    assert e.value.status_code == 429 and e.value.headers["Retry-After"] == "31"
+
+def test_gate_sheds_over_the_limit_and_frees_slots():
+    gate = AdmissionGate("login", limit=2)
+    with gate, gate:
+        with pytest.raises(HTTPException) as e:
+            with gate: pass
+        assert e.value.status_code == 429
+    assert gate.in_flight == 0
+    with gate: pass  # slots are back after the failures too
+    assert (gate.admitted, gate.shed, gate.peak) == (3, 1, 2)
+
+def test_gate_releases_slot_when_handler_fails():
+    gate = AdmissionGate("login", limit=1)
+    with pytest.raises(RuntimeError):
+        with gate: raise RuntimeError("boom")
+    assert gate.in_flight == 0
+
+def test_gate_without_limit_admits_everything():
+    gate = AdmissionGate("rooms", limit=0)
+    with gate, gate, gate: assert gate.in_flight == 3
@@ -29,6 +29,12 @@ let peerConnection;
 let accessToken = "";
 let iceCandidateQueue = [];
 let isInitializing = false;
+let outgoingCandidates = [];
+let candidateFlushTimer = null;
+let iceConnectedReported = false;
+
+// Local candidates are held this long and sent as one 'ice-candidates' frame
+const ICE_BATCH_MS = 50;
 
 const rtcConfig = {
     iceServers: [
@@ -38,7 +44,7 @@ const rtcConfig = {
         { urls: 'stun:stun3.l.google.com:19302' },
         { urls: 'stun:stun4.l.google.com:19302' }
     ],
-    iceCandidatePoolSize: 10
+    iceCandidatePoolSize: 2
 };
 
 function generateId() {
@@ -89,38 +95,7 @@ function connectWebSocket() {
     ws = new WebSocket(wsUrl);
 
     ws.onmessage = async (event) => {
-        const message = JSON.parse(event.data);
-        
-        switch (message.type) {
-            case 'peer-joined':
-                console.log("[P2P] Other peer joined. Initiating connection...");
-                if (!peerConnection && !isInitializing) await initPeerConnection(true);
-                break;
-            case 'offer':
-                console.log("[P2P] Received offer.");
-                if (!peerConnection && !isInitializing) await initPeerConnection(false);
-                await handleOffer(message.sdp);
-                break;
-            case 'answer':
-                console.log("[P2P] Received answer.");
-                await handleAnswer(message.sdp);
-                break;
-            case 'ice-candidate':
-                handleRemoteCandidate(message.candidate);
-                break;
-            case 'media-status':
-                remoteLabel.innerText = message.micEnabled ? "Peer Connected" : "Peer Muted";
-                remoteLabel.style.color = message.micEnabled ? "white" : "#ff4444";
-                break;
-            case 'close-session':
-            case 'peer-left':
-                console.log("[P2P] Session terminated by peer. Cleaning up...");
-                cleanupAndExit(false); 
-                break;
-            case 'chat':
-                appendChatMessage(message.username, message.text, false);
-                break;
-        }
+        await handleSignal(JSON.parse(event.data));
     };
 
     ws.onclose = (e) => {
@@ -128,6 +103,50 @@ function connectWebSocket() {
     };
 }
 
+async function handleSignal(message) {
+    switch (message.type) {
+        case 'peer-joined':
+            console.log("[P2P] Other peer joined. Initiating connection...");
+            if (!peerConnection && !isInitializing) await initPeerConnection(true);
+            break;
+        case 'offer':
+            console.log("[P2P] Received offer.");
+            if (!peerConnection && !isInitializing) await initPeerConnection(false);
+            await handleOffer(message.sdp);
+            break;
+        case 'answer':
+            console.log("[P2P] Received answer.");
+            await handleAnswer(message.sdp);
+            break;
+        case 'ice-candidate':
+            handleRemoteCandidate(message.candidate);
+            break;
+        case 'ice-candidates':
+            message.candidates.forEach(handleRemoteCandidate);
+            break;
+        case 'batch':
+            // Server-coalesced frames, in original order
+            for (const frame of message.frames) await handleSignal(frame);
+            break;
+        case 'media-status':
+            remoteLabel.innerText = message.micEnabled ? "Peer Connected" : "Peer Muted";
+            remoteLabel.style.color = message.micEnabled ? "white" : "#ff4444";
+            break;
+        case 'close-session':
+        case 'peer-left':
+            console.log("[P2P] Session terminated by peer. Cleaning up...");
+            cleanupAndExit(false); 
+            break;
+        case 'chat':
+            appendChatMessage(message.username, message.text, false);
+            break;
+        case 'ping':
+            // Server heartbeat; silent sockets are closed after WS_IDLE_TIMEOUT
+            ws.send(JSON.stringify({ type: 'pong' }));
+            break;
+    }
+}
+
 async function initPeerConnection(isInitiator) {
     if (peerConnection || isInitializing) return;
     isInitializing = true;
@@ -145,8 +164,19 @@ async function initPeerConnection(isInitiator) {
     };
 
     peerConnection.onicecandidate = (event) => {
-        if (event.candidate && ws && ws.readyState === WebSocket.OPEN) {
-            ws.send(JSON.stringify({ type: 'ice-candidate', candidate: event.candidate }));
+        if (event.candidate) {
+            outgoingCandidates.push(event.candidate);
+            if (!candidateFlushTimer) candidateFlushTimer = setTimeout(flushCandidates, ICE_BATCH_MS);
+        } else {
+            flushCandidates(); // gathering complete
+        }
+    };
+
+    peerConnection.oniceconnectionstatechange = () => {
+        const state = peerConnection && peerConnection.iceConnectionState;
+        if ((state === 'connected' || state === 'completed') && !iceConnectedReported && ws && ws.readyState === WebSocket.OPEN) {
+            iceConnectedReported = true;
+            ws.send(JSON.stringify({ type: 'ice-connected' }));
         }
     };
 
@@ -175,6 +205,13 @@ async function handleAnswer(sdp) {
     }
 }
 
+function flushCandidates() {
+    if (candidateFlushTimer) { clearTimeout(candidateFlushTimer); candidateFlushTimer = null; }
+    if (!outgoingCandidates.length || !ws || ws.readyState !== WebSocket.OPEN) return;
+    ws.send(JSON.stringify({ type: 'ice-candidates', candidates: outgoingCandidates }));
+    outgoingCandidates = [];
+}
+
 function handleRemoteCandidate(candidate) {
     if (peerConnection && peerConnection.remoteDescription && peerConnection.remoteDescription.type) {
         peerConnection.addIceCandidate(new RTCIceCandidate(candidate)).catch(e => {});
@@ -224,17 +261,19 @@ window.captureImage = async (label) => {
     canvas.width = remoteVideo.videoWidth; canvas.height = remoteVideo.videoHeight;
     const ctx = canvas.getContext('2d');
     ctx.drawImage(remoteVideo, 0, 0, canvas.width, canvas.height);
-    const dataUrl = canvas.toDataURL('image/png');
+    // Upload raw bytes instead of a base64 data URL (streamed to storage server-side)
+    const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/png'));
     try {
-        const res = await fetch('/api/session/capture', {
+        const params = new URLSearchParams({ room_id: roomId, label: label });
+        const res = await fetch(`/api/session/capture/upload?${params}`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${accessToken}` },
-            body: JSON.stringify({ room_id: roomId, label: label, image_data: dataUrl })
+            headers: { 'Content-Type': blob.type, 'Authorization': `Bearer ${accessToken}` },
+            body: blob
         });
         if (res.ok) {
             const item = document.createElement('div');
             item.className = 'capture-item';
-            item.innerHTML = `<img src="${dataUrl}"><p>${label} - Saved</p>`;
+            item.innerHTML = `<img src="${URL.createObjectURL(blob)}"><p>${label} - Saved</p>`;
             captureGallery.prepend(item);
         }
     } catch (err) { console.error(err); }